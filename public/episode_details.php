@@ -0,0 +1,48 @@
+<?php
+declare(strict_types=1);
+
+/**
+ * public/episode_details.php
+ *
+ * JSON endpoint for lazily loading episode text (summary, titles) from the
+ * cold playlistEpisodeDetails table, only for the rows the page displays
+ * (timeslots.php fetches a show's episodes when its list is expanded).
+ *   GET ?keys=123,456,789                       (at most 500 ratingKeys)
+ *   GET ?show_id=4567&limit=50&after=<cursor>   (one page of a show's episodes)
+ * Returns episodeDetails.py output as-is:
+ *   {"ok": true, "episodes": [{"ratingKey":..,"season":..,"episode":..,"summary":..,"title":..,"episodeTitle":..,"watched":..}], "next": "<cursor>|null"}
+ */
+
+require __DIR__ . '/_bootstrap.php';
+
+header('Content-Type: application/json');
+
+$keys   = isset($_GET['keys']) ? (string)$_GET['keys'] : '';
+$showId = isset($_GET['show_id']) ? (int)$_GET['show_id'] : 0;
+$limit  = isset($_GET['limit']) ? (int)$_GET['limit'] : 50;
+$after  = isset($_GET['after']) ? (string)$_GET['after'] : '';
+
+if ($showId > 0) {
+    // --opt=value keeps values that start with '-' (cursors can) away from argparse option parsing
+    $args = ['--show=' . $showId, '--limit=' . $limit];
+    if ($after !== '') { $args[] = '--after=' . $after; }
+} elseif (preg_match('/^\d+(,\d+)*$/', $keys)) {
+    $args = ['--keys=' . $keys];
+} else {
+    http_response_code(400);
+    echo json_encode(['ok' => false, 'error' => 'Pass keys (comma-separated ratingKeys) or show_id']);
+    exit;
+}
+
+$r = run_py_logged('episodeDetails.py', $args);
+$out = trim((string)$r['stdout']);
+
+if ($out === '' || json_decode($out, true) === null) {
+    http_response_code(500);
+    echo json_encode(['ok' => false, 'error' => 'episodeDetails.py failed', 'stderr' => (string)$r['stderr']]);
+    exit;
+}
+if ($r['exit_code'] !== 0) {
+    http_response_code($r['exit_code'] === 2 ? 400 : 500);
+}
+echo $out;
@@ -0,0 +1,36 @@
+<?php
+declare(strict_types=1);
+
+/**
+ * public/shows_search.php
+ *
+ * JSON endpoint for the show picker: one page of allShows at a time.
+ *   GET ?q=star%20tr&limit=50&after=<cursor>
+ * Returns searchShows.py output as-is:
+ *   {"ok": true, "shows": [{"id":..,"title":..,"total_episodes":..,"selected":..}], "next": "<cursor>|null"}
+ */
+
+require __DIR__ . '/_bootstrap.php';
+
+header('Content-Type: application/json');
+
+$q     = isset($_GET['q']) ? (string)$_GET['q'] : '';
+$limit = isset($_GET['limit']) ? (int)$_GET['limit'] : 50;
+$after = isset($_GET['after']) ? (string)$_GET['after'] : '';
+
+// --opt=value so a query (or cursor) starting with '-' is not taken for an option
+$args = ['--q=' . $q, '--limit=' . $limit];
+if ($after !== '') { $args[] = '--after=' . $after; }
+
+$r = run_py_logged('searchShows.py', $args);
+$out = trim((string)$r['stdout']);
+
+if ($out === '' || json_decode($out, true) === null) {
+    http_response_code(500);
+    echo json_encode(['ok' => false, 'error' => 'searchShows.py failed', 'stderr' => (string)$r['stderr']]);
+    exit;
+}
+if ($r['exit_code'] !== 0) {
+    http_response_code($r['exit_code'] === 2 ? 400 : 500);
+}
+echo $out;
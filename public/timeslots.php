@@ -9,18 +9,15 @@ require __DIR__ . '/_csrf.php';
 $ROOT = realpath(__DIR__ . '/..');
 $dbFilePath = $ROOT . '/database/plex_playlist.db';
 
-// Scripts (names only; helpers prepend /scripts)
-$getEpisodesScript       = 'getEpisodes.py';
-$newPlaylistScript       = 'newPlaylist.py';
-$generatePlaylistScript  = 'generatePlaylist.py';
+// Coordinator runs getEpisodes.py -> newPlaylist.py --fill (-> generatePlaylist.py if needed)
+// under the pipeline lock and coalesces concurrent submissions.
+$runPipelineScript = 'runPipeline.py';
 
-// Logs
+// Logs (per-step logs are written by the coordinator next to this one)
 $logDir = $ROOT . '/logs';
 if (!is_dir($logDir)) { @mkdir($logDir, 0775, true); }
 $timestamp = date('Ymd_His');
-$log_getEpisodes      = "$logDir/getEpisodes_$timestamp.log";
-$log_newPlaylist      = "$logDir/newPlaylist_$timestamp.log";
-$log_generatePlaylist = "$logDir/generatePlaylist_$timestamp.log";
+$log_runPipeline = "$logDir/runPipeline_$timestamp.log";
 
 // ---- DB connect (to list shows & set timeslots) ----
 try {
@@ -54,9 +51,18 @@ if ($_SERVER["REQUEST_METHOD"] === "POST" && isset($_POST['timeslots'])) {
     }
 }
 
-// Fetch shows for form
-$sql = "SELECT id, title, timeSlot, total_episodes FROM playlistShows ORDER BY total_episodes ASC";
-$stmt = $conn->query($sql);
+// Fetch shows for form, with the ingested totals from showAggregates
+// (maintained by getEpisodes.py; NULL until a show's episodes are ingested)
+$sql = "SELECT p.id, p.title, p.timeSlot, p.total_episodes, a.total_minutes, a.unwatched_count
+        FROM playlistShows p
+        LEFT JOIN showAggregates a ON a.show_id = p.id
+        ORDER BY p.total_episodes ASC";
+try {
+    $stmt = $conn->query($sql);
+} catch (PDOException $e) {
+    // Database from before the aggregates existed (setup.php adds them)
+    $stmt = $conn->query("SELECT id, title, timeSlot, total_episodes FROM playlistShows ORDER BY total_episodes ASC");
+}
 $shows = $stmt->fetchAll(PDO::FETCH_ASSOC);
 $numOfShows = count($shows);
 
@@ -68,63 +74,27 @@ foreach ($shows as $index => $show) {
 // We won't use $conn after this
 $conn = null;
 
-// ---- Helper: run with logging via bootstrap ----
-function run_with_logging(string $script, array $args, string $logfile): array {
-    return run_py_logged($script, $args, $logfile);
-}
-
 // ---- If form validated, run the pipeline ----
 if ($shouldRunPipeline) {
-    // 1) getEpisodes.py
-    $r1 = run_with_logging($getEpisodesScript, [], $log_getEpisodes);
-    if ($r1['exit_code'] !== 0) {
-        require __DIR__ . '/partials/head.php';
-        require __DIR__ . '/partials/nav.php';
-        echo "<pre style='color:#c00;'>getEpisodes.py failed (exit {$r1['exit_code']}). See log:\n{$log_getEpisodes}\n\nSTDERR:\n" . htmlspecialchars((string)$r1['stderr'], ENT_QUOTES, 'UTF-8') . "</pre>";
-        require __DIR__ . '/partials/footer.php';
-        exit;
-    }
-
-    // 2) newPlaylist.py -> expect JSON
-    $r2 = run_with_logging($newPlaylistScript, [], $log_newPlaylist);
-    if ($r2['exit_code'] !== 0) {
-        require __DIR__ . '/partials/head.php';
-        require __DIR__ . '/partials/nav.php';
-        echo "<pre style='color:#c00;'>newPlaylist.py failed (exit {$r2['exit_code']}). See log:\n{$log_newPlaylist}\n\nSTDERR:\n" . htmlspecialchars((string)$r2['stderr'], ENT_QUOTES, 'UTF-8') . "</pre>";
-        require __DIR__ . '/partials/footer.php';
-        exit;
-    }
+    $r = run_py_logged($runPipelineScript, [], $log_runPipeline);
+    $json = json_decode(trim((string)$r['stdout']), true);
 
-    $ratingKey = null;
-    $json = json_decode($r2['stdout'], true);
-    if (is_array($json) && !empty($json['ok']) && !empty($json['ratingKey'])) {
-        $ratingKey = (int)$json['ratingKey'];
-    }
-
-    if ($ratingKey) {
-        // 3) generatePlaylist.py <ratingKey>
-        $r3 = run_with_logging($generatePlaylistScript, [ (string)$ratingKey ], $log_generatePlaylist);
-        if ($r3['exit_code'] !== 0) {
-            require __DIR__ . '/partials/head.php';
-            require __DIR__ . '/partials/nav.php';
-            echo "<pre style='color:#c00;'>generatePlaylist.py failed (exit {$r3['exit_code']}). See log:\n{$log_generatePlaylist}\n\nSTDERR:\n" . htmlspecialchars((string)$r3['stderr'], ENT_QUOTES, 'UTF-8') . "</pre>";
-            require __DIR__ . '/partials/footer.php';
-            exit;
-        }
-
-        // Success
-        require __DIR__ . '/partials/head.php';
-        require __DIR__ . '/partials/nav.php';
+    require __DIR__ . '/partials/head.php';
+    require __DIR__ . '/partials/nav.php';
+    if ($r['exit_code'] === 0 && is_array($json) && !empty($json['ok'])) {
         echo "<script>alert('Playlist Generated in Plex'); window.location.href = '../index.php';</script>";
-        require __DIR__ . '/partials/footer.php';
-        exit;
+    } elseif (is_array($json) && !empty($json['step'])) {
+        $step = (string)$json['step'];
+        $stepExit = (int)($json['exit_code'] ?? -1);
+        $stepLog = (string)($json['log'] ?? $log_runPipeline);
+        $detail = !empty($json['error']) ? $json['error'] . "\n\nSTDOUT:\n" . ($json['stdout'] ?? '') . "\n\n" : '';
+        echo "<pre style='color:#c00;'>" . htmlspecialchars("{$step} failed (exit {$stepExit}). See log:\n{$stepLog}\n\n{$detail}STDERR:\n" . ($json['stderr'] ?? ''), ENT_QUOTES, 'UTF-8') . "</pre>";
     } else {
-        require __DIR__ . '/partials/head.php';
-        require __DIR__ . '/partials/nav.php';
-        echo "<pre style='color:#c00;'>Failed to create new playlist or retrieve its ratingKey.\nSee log for details:\n{$log_newPlaylist}\n\nSTDOUT:\n" . htmlspecialchars((string)$r2['stdout'], ENT_QUOTES, 'UTF-8') . "\n\nSTDERR:\n" . htmlspecialchars((string)$r2['stderr'], ENT_QUOTES, 'UTF-8') . "</pre>";
-        require __DIR__ . '/partials/footer.php';
-        exit;
+        $msg = is_array($json) && !empty($json['error']) ? (string)$json['error'] : 'runPipeline.py failed.';
+        echo "<pre style='color:#c00;'>" . htmlspecialchars("{$msg} (exit {$r['exit_code']}). See log:\n{$log_runPipeline}\n\nSTDERR:\n" . $r['stderr'], ENT_QUOTES, 'UTF-8') . "</pre>";
     }
+    require __DIR__ . '/partials/footer.php';
+    exit;
 }
 
 // ---------- RENDER FORM ----------
@@ -154,7 +124,18 @@ require __DIR__ . '/partials/nav.php';
                         <?= htmlspecialchars((string)$show['title'], ENT_QUOTES, 'UTF-8') ?>
                         &mdash; Episodes:
                         <?= htmlspecialchars((string)$show['total_episodes'], ENT_QUOTES, 'UTF-8') ?>
+                        <?php if (isset($show['total_minutes'])): ?>
+                            <small class="text-muted">
+                                (<?= intdiv((int)$show['total_minutes'], 60) ?>h <?= (int)$show['total_minutes'] % 60 ?>m,
+                                <?= (int)$show['unwatched_count'] ?> unwatched)
+                            </small>
+                        <?php endif; ?>
                     </span>
+                    <details class="small episode-details" data-show-id="<?= (int)$show['id'] ?>">
+                        <summary class="text-muted">Episodes</summary>
+                        <ul class="list-unstyled mb-1 ms-3"></ul>
+                        <button type="button" class="btn btn-link btn-sm p-0" hidden>More</button>
+                    </details>
                 </div>
                 <div class="col-4">
                     <select class="form-select form-select-sm" name="timeslots[<?= (int)$show['id'] ?>]">
@@ -168,4 +149,45 @@ require __DIR__ . '/partials/nav.php';
         <button class="btn btn-success mt-3" type="submit">Generate Playlist</button>
     </form>
 </div>
+<script>
+// Episode summaries/titles live in a separate table; load them only when a show is expanded
+document.querySelectorAll('details.episode-details').forEach(function (box) {
+    const list = box.querySelector('ul');
+    const more = box.querySelector('button');
+    let next = null, loaded = false;
+
+    async function loadPage() {
+        more.hidden = true;
+        const params = new URLSearchParams({ show_id: box.dataset.showId, limit: '50' });
+        if (next) params.set('after', next);
+        try {
+            const res = await fetch('episode_details.php?' + params.toString());
+            const data = await res.json();
+            if (!data.ok) throw new Error(data.error || 'request failed');
+            for (const ep of data.episodes) {
+                const li = document.createElement('li');
+                const code = 'S' + String(ep.season ?? '?').padStart(2, '0') + 'E' + String(ep.episode ?? '?').padStart(2, '0');
+                li.textContent = code + ' \u2014 ' + (ep.episodeTitle || '') + (ep.watched ? ' (watched)' : '');
+                if (ep.summary) li.title = ep.summary;
+                list.appendChild(li);
+            }
+            if (!data.episodes.length && !list.children.length) {
+                list.textContent = 'No episodes loaded yet (they are fetched when the playlist is generated).';
+            }
+            next = data.next;
+            more.hidden = !next;
+        } catch (e) {
+            const li = document.createElement('li');
+            li.className = 'text-danger';
+            li.textContent = 'Could not load episodes: ' + e.message;
+            list.appendChild(li);
+        }
+    }
+
+    box.addEventListener('toggle', function () {
+        if (box.open && !loaded) { loaded = true; loadPage(); }
+    });
+    more.addEventListener('click', loadPage);
+});
+</script>
 <?php require __DIR__ . '/partials/footer.php'; ?>
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+adaptive_batch.py
+
+Purpose:
+  Adaptive batch sizing for playlist add calls. (Removals are not batched:
+  plexapi sends one DELETE per item, so the batch size would not change the
+  number of round trips.)
+
+  - Grows the batch (x1.5) while a call finishes well under the latency target.
+  - Halves it when a call is slower than the target.
+  - On a failure or timeout, asks the caller whether the batch actually landed
+    (a timed-out PUT may still have been applied), halves the size and retries
+    whatever is left. Each failure also lowers a per-run ceiling to 3/4 of the
+    failed size, so growth does not walk straight back into the same failure.
+    Gives up after PLEX_BATCH_RETRIES consecutive failures at the minimum size.
+  - The tuned size is stored per Plex server (machineIdentifier) and operation
+    in the SQLite `settings` table, so the next run starts where this one ended.
+    The calling script runs db_migrate.migrate() first; this module has no DDL.
+
+Environment (optional; read when a batcher is created, so values from .env apply):
+  PLEX_BATCH_TARGET_SECONDS  latency target per call (default 2.0)
+  PLEX_BATCH_MIN             smallest batch (default 25)
+  PLEX_BATCH_MAX             largest batch (default 2000)
+  PLEX_BATCH_RETRIES         failures tolerated at the minimum size (default 3)
+"""
+
+import os
+import sys
+import time
+import sqlite3
+from typing import Callable, List, Optional, Sequence
+
+DEFAULT_SIZE = 500
+
+
+def _env_number(name: str, default, cast):
+    try:
+        return cast(os.getenv(name, '') or default)
+    except ValueError:
+        return default
+
+
+class AdaptiveBatcher:
+    def __init__(self, db_path: str, server_id: str, op: str,
+                 initial: int = DEFAULT_SIZE, min_size: Optional[int] = None, max_size: Optional[int] = None,
+                 target_seconds: Optional[float] = None, retries: Optional[int] = None):
+        if min_size is None:
+            min_size = _env_number('PLEX_BATCH_MIN', 25, int)
+        if max_size is None:
+            max_size = _env_number('PLEX_BATCH_MAX', 2000, int)
+        if target_seconds is None:
+            target_seconds = _env_number('PLEX_BATCH_TARGET_SECONDS', 2.0, float)
+        if retries is None:
+            retries = _env_number('PLEX_BATCH_RETRIES', 3, int)
+        self.db_path = db_path
+        self.key = f"batch_size:{op}:{server_id}"
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.target = target_seconds
+        self.retries = retries
+        self.ceiling = self.max_size
+        self.size = self._clamp(self._load() or initial)
+
+    def _clamp(self, n: int) -> int:
+        return max(self.min_size, min(self.ceiling, int(n)))
+
+    def _load(self) -> Optional[int]:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute("SELECT value FROM settings WHERE key = ?", (self.key,)).fetchone()
+            return int(row[0]) if row else None
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def save(self) -> None:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "INSERT INTO settings(key, value) VALUES(?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                    (self.key, str(self.size)),
+                )
+        except sqlite3.Error as e:
+            print(f"[WARN] Could not save tuned batch size ({self.key}): {e}", file=sys.stderr)
+
+    def _observe(self, seconds: float) -> None:
+        if seconds > self.target:
+            self.size = self._clamp(self.size // 2)
+        elif seconds < self.target / 2:
+            self.size = self._clamp(self.size * 3 // 2 + 1)
+
+    def run(self, items: Sequence, send: Callable[[List], None],
+            recover: Optional[Callable[[List], List]] = None) -> int:
+        """
+        Send all items in adaptively sized batches. `recover(batch)` is called
+        after a failed send and returns the part of the batch that still needs
+        sending. Returns the number of items sent; re-raises the last error
+        once retries are exhausted.
+        """
+        pos = 0
+        sent = 0
+        failures = 0
+        pending: List = []
+        while pos < len(items) or pending:
+            if not pending:
+                pending = list(items[pos:pos + self.size])
+                pos += len(pending)
+            batch = pending[:self.size]
+            started = time.monotonic()
+            try:
+                send(batch)
+            except Exception as e:
+                left = batch
+                if recover is not None:
+                    try:
+                        left = recover(batch)
+                    except Exception:
+                        left = batch
+                sent += len(batch) - len(left)
+                pending = left + pending[len(batch):]
+                if not left:
+                    failures = 0
+                    continue
+                if self.size <= self.min_size:
+                    failures += 1
+                    if failures >= self.retries:
+                        raise
+                old = self.size
+                self.ceiling = max(self.min_size, min(self.ceiling, len(batch) * 3 // 4))
+                self.size = self._clamp(self.size // 2)
+                print(f"[WARN] Batch of {len(batch)} failed ({e}); retrying with batch size {self.size} (was {old}).",
+                      file=sys.stderr)
+                continue
+            failures = 0
+            sent += len(batch)
+            pending = pending[len(batch):]
+            self._observe(time.monotonic() - started)
+        return sent
@@ -4,14 +4,15 @@ from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 DB = ROOT / 'database' / 'plex_playlist.db'
-DB.parent.mkdir(parents=True, exist_ok=True)
 
 SQL = """
 -- Ensure tables exist before we create indexes
 CREATE TABLE IF NOT EXISTS allShows (
   id INTEGER PRIMARY KEY,
   title TEXT NOT NULL,
-  total_episodes INTEGER DEFAULT 0
+  total_episodes INTEGER DEFAULT 0,
+  section_id INTEGER,
+  updated_at INTEGER
 );
 CREATE TABLE IF NOT EXISTS playlistShows (
   id INTEGER PRIMARY KEY,
@@ -19,36 +20,266 @@ CREATE TABLE IF NOT EXISTS playlistShows (
   total_episodes INTEGER DEFAULT 0,
   timeSlot INTEGER
 );
+CREATE TABLE IF NOT EXISTS settings (
+  key   TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pipelineRuns (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  fingerprint TEXT NOT NULL,
+  status TEXT NOT NULL,
+  pid INTEGER,
+  created_at REAL NOT NULL,
+  started_at REAL,
+  finished_at REAL,
+  result TEXT
+);
+CREATE TABLE IF NOT EXISTS missingRatingKeys (
+  ratingKey INTEGER PRIMARY KEY,
+  show_id INTEGER,
+  first_missing REAL NOT NULL,
+  last_checked REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS showAggregates (
+  show_id INTEGER PRIMARY KEY,
+  timeSlot INTEGER,
+  episode_count INTEGER NOT NULL DEFAULT 0,
+  season_count INTEGER NOT NULL DEFAULT 0,
+  total_minutes INTEGER NOT NULL DEFAULT 0,
+  unwatched_count INTEGER NOT NULL DEFAULT 0,
+  first_air_date TEXT,
+  last_air_date TEXT
+);
+CREATE TABLE IF NOT EXISTS slotAggregates (
+  timeSlot INTEGER PRIMARY KEY,
+  show_count INTEGER NOT NULL DEFAULT 0,
+  episode_count INTEGER NOT NULL DEFAULT 0,
+  total_minutes INTEGER NOT NULL DEFAULT 0,
+  unwatched_count INTEGER NOT NULL DEFAULT 0,
+  first_air_date TEXT,
+  last_air_date TEXT
+);
+CREATE TABLE IF NOT EXISTS plannedOrder (
+  position INTEGER PRIMARY KEY,
+  ratingKey INTEGER NOT NULL,
+  day INTEGER NOT NULL,
+  timeSlot INTEGER NOT NULL,
+  start_minute INTEGER NOT NULL
+);
+
+-- Now indexes
+CREATE INDEX IF NOT EXISTS idx_playlistShows_id
+  ON playlistShows(id);
+
+CREATE INDEX IF NOT EXISTS idx_pipelineRuns_status
+  ON pipelineRuns(status);
+"""
+
+# Episodes are split hot/cold: playlistEpisodes holds only what ordering,
+# planning and the aggregates read; display text lives in playlistEpisodeDetails
+# (one row per ratingKey, loaded on demand). playlistEpisodesFull keeps the old
+# row shape for ad-hoc queries.
+EPISODES_SQL = """
 CREATE TABLE IF NOT EXISTS playlistEpisodes (
   ratingKey INTEGER PRIMARY KEY,
   season INTEGER,
   episode INTEGER,
   releaseDate TEXT,
   duration INTEGER,
-  summary TEXT,
   watchedStatus BOOLEAN,
-  title TEXT,
-  episodeTitle TEXT,
   show_id INTEGER,
   timeSlot INTEGER
 );
-CREATE TABLE IF NOT EXISTS settings (
-  key   TEXT PRIMARY KEY,
-  value TEXT NOT NULL
+CREATE TABLE IF NOT EXISTS playlistEpisodeDetails (
+  ratingKey INTEGER PRIMARY KEY,
+  summary TEXT,
+  title TEXT,
+  episodeTitle TEXT
 );
+CREATE TRIGGER IF NOT EXISTS playlistEpisodes_details_ad AFTER DELETE ON playlistEpisodes BEGIN
+  DELETE FROM playlistEpisodeDetails WHERE ratingKey = old.ratingKey;
+END;
+CREATE VIEW IF NOT EXISTS playlistEpisodesFull AS
+SELECT e.ratingKey, e.season, e.episode, e.releaseDate, e.duration, d.summary,
+       e.watchedStatus, d.title, d.episodeTitle, e.show_id, e.timeSlot
+FROM playlistEpisodes e
+LEFT JOIN playlistEpisodeDetails d ON d.ratingKey = e.ratingKey;
+"""
 
--- Now indexes
-CREATE INDEX IF NOT EXISTS idx_playlistEpisodes_slot_show
-  ON playlistEpisodes(timeSlot, show_id, season, episode);
+# Pre-split playlistEpisodes (summary/title/episodeTitle inline) -> hot + cold.
+# Run statement by statement inside one BEGIN IMMEDIATE (see split_episode_details).
+SPLIT_SQL = """
+ALTER TABLE playlistEpisodes RENAME TO playlistEpisodesLegacy;
+""" + EPISODES_SQL + """
+INSERT INTO playlistEpisodes (ratingKey, season, episode, releaseDate, duration, watchedStatus, show_id, timeSlot)
+  SELECT ratingKey, season, episode, releaseDate, duration, watchedStatus, show_id, timeSlot
+  FROM playlistEpisodesLegacy;
+INSERT OR REPLACE INTO playlistEpisodeDetails (ratingKey, summary, title, episodeTitle)
+  SELECT ratingKey, summary, title, episodeTitle
+  FROM playlistEpisodesLegacy;
+DROP TABLE playlistEpisodesLegacy;
+"""
 
-CREATE INDEX IF NOT EXISTS idx_playlistShows_id
-  ON playlistShows(id);
+# (name, CREATE statement). Recreated when the stored definition differs.
+EPISODE_INDEXES = [
+    # Covering index for the ordering scan (episode_store.ORDER_SQL reads
+    # ratingKey, the rowid, plus these columns): no table lookups at all
+    ('idx_playlistEpisodes_slot_show',
+     "CREATE INDEX idx_playlistEpisodes_slot_show "
+     "ON playlistEpisodes(timeSlot, show_id, season, episode, duration)"),
+    # Unwatched-only generation (--unwatched-only); only unwatched rows are indexed.
+    # watchedStatus is listed so the WHERE term is answered from the index too.
+    ('idx_playlistEpisodes_unwatched',
+     "CREATE INDEX idx_playlistEpisodes_unwatched "
+     "ON playlistEpisodes(timeSlot, show_id, season, episode, duration, watchedStatus) WHERE watchedStatus = 0"),
+]
+
+# Columns added after a table's first release: (table, column, declaration).
+# CREATE TABLE IF NOT EXISTS leaves older databases untouched, so add them here.
+COLUMNS = [
+    ('allShows', 'section_id', 'INTEGER'),
+    ('allShows', 'updated_at', 'INTEGER'),
+]
+
+# Indexes on the columns above (must run after they exist)
+LATE_SQL = """
+CREATE INDEX IF NOT EXISTS idx_allShows_section
+  ON allShows(section_id);
+
+-- Keyset paging for the show picker (searchShows.py)
+CREATE INDEX IF NOT EXISTS idx_allShows_title
+  ON allShows(title COLLATE NOCASE, id);
+"""
+
+# Full-text index over show titles, kept in sync with allShows by triggers.
+# External-content table: titles are stored once, in allShows.
+FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS allShows_fts USING fts5(
+  title,
+  content='allShows',
+  content_rowid='id',
+  tokenize='unicode61 remove_diacritics 2',
+  prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS allShows_fts_ai AFTER INSERT ON allShows BEGIN
+  INSERT INTO allShows_fts(rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS allShows_fts_ad AFTER DELETE ON allShows BEGIN
+  INSERT INTO allShows_fts(allShows_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS allShows_fts_au AFTER UPDATE OF id, title ON allShows BEGIN
+  INSERT INTO allShows_fts(allShows_fts, rowid, title) VALUES ('delete', old.id, old.title);
+  INSERT INTO allShows_fts(rowid, title) VALUES (new.id, new.title);
+END;
 """
 
+def add_missing_columns(conn):
+    for table, column, decl in COLUMNS:
+        have = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in have:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def statements(script):
+    """Split a SQL script into complete statements (trigger bodies stay whole)."""
+    buf = ''
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            yield buf.strip()
+            buf = ''
+    if buf.strip():
+        yield buf.strip()
+
+def locked(conn, needed, work):
+    """
+    Run work(conn) in a BEGIN IMMEDIATE transaction if needed(conn) still holds
+    once the write lock is ours; several scripts may migrate at the same time.
+    Returns True if the work ran.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ran = needed(conn)
+        if ran:
+            work(conn)
+        conn.execute("COMMIT")
+        return ran
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def episode_columns(conn):
+    return {row[1] for row in conn.execute("PRAGMA table_info(playlistEpisodes)")}
+
+def split_episode_details(conn):
+    """Create the hot/cold episode tables, moving display text out of a pre-split table."""
+    if 'summary' not in episode_columns(conn):
+        conn.executescript(EPISODES_SQL)
+        return
+
+    def split(c):
+        for stmt in statements(SPLIT_SQL):
+            c.execute(stmt)
+
+    if not locked(conn, lambda c: 'summary' in episode_columns(c), split):
+        return
+    print("[INFO] Moved episode summaries/titles to playlistEpisodeDetails.", file=sys.stderr)
+    try:
+        conn.execute("VACUUM")  # hand the freed pages back; not required for correctness
+    except sqlite3.Error:
+        pass
+
+def index_current(conn, name, sql):
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+    return bool(row) and ' '.join((row[0] or '').split()) == ' '.join(sql.split())
+
+def ensure_indexes(conn):
+    for name, sql in EPISODE_INDEXES:
+        if index_current(conn, name, sql):
+            continue
+
+        def rebuild(c, name=name, sql=sql):
+            c.execute(f"DROP INDEX IF EXISTS {name}")
+            c.execute(sql)
+
+        locked(conn, lambda c, name=name, sql=sql: not index_current(c, name, sql), rebuild)
+
+def has_fts(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'allShows_fts'"
+    ).fetchone() is not None
+
+def ensure_fts(conn):
+    """Create the title search index; backfill it the first time. Skipped if SQLite lacks FTS5."""
+    existed = has_fts(conn)
+    try:
+        conn.executescript(FTS_SQL)
+    except sqlite3.OperationalError as e:
+        print(f"[WARN] FTS5 unavailable, show search falls back to LIKE: {e}", file=sys.stderr)
+        return
+    if not existed:
+        conn.execute("INSERT INTO allShows_fts(allShows_fts) VALUES ('rebuild')")
+
+def migrate(conn):
+    """
+    Bring the schema up to date. Safe to run repeatedly.
+    Scripts call this once at startup, before opening a transaction of their
+    own: it commits, and may rebuild indexes or VACUUM. Helper modules
+    (missing_keys, episode_aggregates, ...) assume it has run and hold no DDL.
+    """
+    conn.executescript(SQL)
+    add_missing_columns(conn)
+    split_episode_details(conn)
+    ensure_indexes(conn)
+    conn.executescript(LATE_SQL)
+    ensure_fts(conn)
+    conn.commit()
+
 def main():
+    DB.parent.mkdir(parents=True, exist_ok=True)
     try:
         with sqlite3.connect(DB) as conn:
-            conn.executescript(SQL)
+            migrate(conn)
         return 0
     except Exception as e:
         print(f"[ERROR] migration failed: {e}", file=sys.stderr)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+episodeDetails.py
+
+Usage:
+  python episodeDetails.py --keys 123,456,789
+  python episodeDetails.py --show 4567 [--limit 50] [--after <cursor>]
+
+Purpose:
+  Display text for episodes, read on demand from the cold table
+  playlistEpisodeDetails so the ordering/planning scans never touch it.
+  The UI asks only for the rows it is about to show (timeslots.php loads a
+  show's episode list when it is expanded). Prints JSON:
+    {"ok": true,
+     "episodes": [{"ratingKey": 123, "season": 1, "episode": 2, "summary": "...",
+                   "title": "<show>", "episodeTitle": "...", "watched": false}, ...],
+     "next": "<cursor or null>"}
+
+  - --keys: keys that are not in playlistEpisodes are left out; order follows
+    --keys; "next" is always null.
+  - --show: one page of that show's episodes in (season, episode) order;
+    pass the returned "next" cursor as --after to get the following page.
+
+Exit codes:
+  1 -> SQLite error
+  2 -> Bad arguments
+  0 -> Success
+"""
+
+import os
+import sys
+import json
+import base64
+import sqlite3
+import argparse
+from typing import List, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DB_PATH = os.path.join(ROOT, 'database', 'plex_playlist.db')
+
+MAX_KEYS = 500
+MAX_LIMIT = 200
+
+DETAILS_SELECT = """
+    SELECT e.ratingKey, e.season, e.episode, d.summary, d.title, d.episodeTitle, e.watchedStatus
+    FROM playlistEpisodes e
+    LEFT JOIN playlistEpisodeDetails d ON d.ratingKey = e.ratingKey
+"""
+
+
+def jout(payload, code: int) -> None:
+    print(json.dumps(payload))
+    sys.exit(code)
+
+
+def encode_cursor(season: int, episode: int, rating_key: int) -> str:
+    raw = json.dumps([season, episode, rating_key]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int, int]:
+    raw = base64.urlsafe_b64decode(cursor.encode('ascii') + b'=' * (-len(cursor) % 4))
+    season, episode, rating_key = json.loads(raw)
+    return int(season), int(episode), int(rating_key)
+
+
+def _episode(r) -> dict:
+    return {"ratingKey": int(r[0]), "season": r[1], "episode": r[2], "summary": r[3],
+            "title": r[4], "episodeTitle": r[5], "watched": bool(r[6])}
+
+
+def parse_keys(value: str) -> List[int]:
+    keys = [int(k) for k in value.split(',') if k.strip()]
+    return list(dict.fromkeys(keys))
+
+
+def details(conn: sqlite3.Connection, keys: List[int]) -> dict:
+    marks = ','.join('?' * len(keys))
+    rows = conn.execute(f"{DETAILS_SELECT} WHERE e.ratingKey IN ({marks})", keys).fetchall()
+    by_key = {int(r[0]): _episode(r) for r in rows}
+    return {"ok": True, "episodes": [by_key[k] for k in keys if k in by_key], "next": None}
+
+
+def show_page(conn: sqlite3.Connection, show_id: int, limit: int = 50,
+              after: Optional[Tuple[int, int, int]] = None) -> dict:
+    # NULL season/episode sort as -1, matching EpisodeStore's MISSING
+    order = "COALESCE(e.season, -1), COALESCE(e.episode, -1), e.ratingKey"
+    where, params = ["e.show_id = ?"], [show_id]
+    if after is not None:
+        where.append(f"({order}) > (?, ?, ?)")
+        params.extend(after)
+    rows = conn.execute(
+        f"{DETAILS_SELECT} WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ?",
+        (*params, limit + 1),
+    ).fetchall()
+    page = rows[:limit]
+    last = page[-1] if page else None
+    nxt = (encode_cursor(-1 if last[1] is None else last[1], -1 if last[2] is None else last[2], last[0])
+           if len(rows) > limit else None)
+    return {"ok": True, "episodes": [_episode(r) for r in page], "next": nxt}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Episode display text by ratingKey or show (JSON output).")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--keys", help=f"Comma-separated ratingKeys (at most {MAX_KEYS})")
+    group.add_argument("--show", type=int, help="Show id (playlistShows.id) to list episodes for")
+    parser.add_argument("--limit", type=int, default=50, help=f"Page size with --show (1..{MAX_LIMIT})")
+    parser.add_argument("--after", default="", help="Cursor returned as 'next' by the previous page")
+    args = parser.parse_args()
+
+    keys: List[int] = []
+    after = None
+    if args.keys is not None:
+        try:
+            keys = parse_keys(args.keys)
+        except ValueError:
+            jout({"ok": False, "error": "ratingKeys must be integers"}, 2)
+        if not keys or len(keys) > MAX_KEYS:
+            jout({"ok": False, "error": f"Pass between 1 and {MAX_KEYS} ratingKeys"}, 2)
+    else:
+        try:
+            after = decode_cursor(args.after) if args.after else None
+        except Exception:
+            jout({"ok": False, "error": "Invalid cursor"}, 2)
+
+    try:
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        try:
+            if args.keys is not None:
+                result = details(conn, keys)
+            else:
+                result = show_page(conn, args.show, max(1, min(MAX_LIMIT, args.limit)), after)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        jout({"ok": False, "error": f"SQLite error: {e}"}, 1)
+    jout(result, 0)
+
+
+if __name__ == '__main__':
+    main()
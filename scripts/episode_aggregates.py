@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+episode_aggregates.py
+
+Purpose:
+  Materialized per-show and per-timeSlot totals over playlistEpisodes, so the
+  UI and planning queries read O(shows) rows instead of scanning episodes.
+
+    showAggregates(show_id, timeSlot, episode_count, season_count, total_minutes,
+                   unwatched_count, first_air_date, last_air_date)
+    slotAggregates(timeSlot, show_count, episode_count, total_minutes,
+                   unwatched_count, first_air_date, last_air_date)
+
+  - getEpisodes.py feeds a ShowAggregate while it inserts a show's episodes and
+    calls write_show() once per show (same transaction as the episode rows).
+  - refresh_shows() recomputes selected shows from playlistEpisodes for callers
+    that change rows outside a full ingest (webhookListener.py, refreshWatched.py,
+    missing_keys.py); rebuild_slots() re-derives the slot table from showAggregates.
+  - Shows without a timeSlot yet (add_shows.php stores NULL until timeslots are
+    assigned) get a showAggregates row but count towards no slot:
+    slotAggregates.timeSlot is the rowid, so a NULL key would get a made-up slot.
+
+  Air dates are stored as 'YYYY-MM-DD'; durations are minutes (as in playlistEpisodes).
+  Both tables are defined in db_migrate.py; callers run migrate() at startup.
+"""
+
+import sqlite3
+from typing import Iterable, Optional, Set
+
+
+def air_date(value) -> Optional[str]:
+    """Normalize a date/datetime/ISO string to 'YYYY-MM-DD' (None if absent)."""
+    if not value:
+        return None
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    return str(value)[:10]
+
+
+class ShowAggregate:
+    __slots__ = ('show_id', 'slot', 'episodes', 'seasons', 'minutes', 'unwatched', 'first', 'last')
+
+    def __init__(self, show_id: int, slot: Optional[int]):
+        self.show_id = show_id
+        self.slot = slot
+        self.episodes = 0
+        self.seasons: Set[int] = set()
+        self.minutes = 0
+        self.unwatched = 0
+        self.first: Optional[str] = None
+        self.last: Optional[str] = None
+
+    def add(self, season, duration_minutes: int, watched: bool, released) -> None:
+        self.episodes += 1
+        if season is not None:
+            self.seasons.add(season)
+        self.minutes += int(duration_minutes or 0)
+        if not watched:
+            self.unwatched += 1
+        day = air_date(released)
+        if day:
+            if self.first is None or day < self.first:
+                self.first = day
+            if self.last is None or day > self.last:
+                self.last = day
+
+
+def clear(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM showAggregates")
+    conn.execute("DELETE FROM slotAggregates")
+
+
+def write_show(conn: sqlite3.Connection, agg: ShowAggregate) -> None:
+    """Store one freshly ingested show and fold it into its slot's totals. Caller commits."""
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO showAggregates
+          (show_id, timeSlot, episode_count, season_count, total_minutes,
+           unwatched_count, first_air_date, last_air_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (agg.show_id, agg.slot, agg.episodes, len(agg.seasons), agg.minutes,
+         agg.unwatched, agg.first, agg.last),
+    )
+    if agg.slot is None:
+        return
+    conn.execute(
+        """
+        INSERT INTO slotAggregates
+          (timeSlot, show_count, episode_count, total_minutes, unwatched_count, first_air_date, last_air_date)
+        VALUES (?, 1, ?, ?, ?, ?, ?)
+        ON CONFLICT(timeSlot) DO UPDATE SET
+          show_count      = show_count + 1,
+          episode_count   = episode_count + excluded.episode_count,
+          total_minutes   = total_minutes + excluded.total_minutes,
+          unwatched_count = unwatched_count + excluded.unwatched_count,
+          first_air_date  = min(coalesce(first_air_date, excluded.first_air_date),
+                                coalesce(excluded.first_air_date, first_air_date)),
+          last_air_date   = max(coalesce(last_air_date, excluded.last_air_date),
+                                coalesce(excluded.last_air_date, last_air_date))
+        """,
+        (agg.slot, agg.episodes, agg.minutes, agg.unwatched, agg.first, agg.last),
+    )
+
+
+def refresh_shows(conn: sqlite3.Connection, show_ids: Iterable[int]) -> None:
+    """Recompute the given shows from playlistEpisodes, then the slot table. Caller commits."""
+    ids = sorted({int(s) for s in show_ids})
+    if not ids:
+        return
+    conn.executemany("DELETE FROM showAggregates WHERE show_id = ?", [(s,) for s in ids])
+    conn.executemany(
+        """
+        INSERT INTO showAggregates
+          (show_id, timeSlot, episode_count, season_count, total_minutes,
+           unwatched_count, first_air_date, last_air_date)
+        SELECT show_id, MAX(timeSlot), COUNT(*), COUNT(DISTINCT season),
+               COALESCE(SUM(duration), 0), SUM(CASE WHEN watchedStatus THEN 0 ELSE 1 END),
+               substr(MIN(releaseDate), 1, 10), substr(MAX(releaseDate), 1, 10)
+        FROM playlistEpisodes
+        WHERE show_id = ?
+        GROUP BY show_id
+        """,
+        [(s,) for s in ids],
+    )
+    rebuild_slots(conn)
+
+
+def rebuild_slots(conn: sqlite3.Connection) -> None:
+    """Re-derive slotAggregates from showAggregates (O(shows)). Caller commits."""
+    conn.execute("DELETE FROM slotAggregates")
+    conn.execute(
+        """
+        INSERT INTO slotAggregates
+          (timeSlot, show_count, episode_count, total_minutes, unwatched_count, first_air_date, last_air_date)
+        SELECT timeSlot, COUNT(*), SUM(episode_count), SUM(total_minutes), SUM(unwatched_count),
+               MIN(first_air_date), MAX(last_air_date)
+        FROM showAggregates
+        WHERE timeSlot IS NOT NULL
+        GROUP BY timeSlot
+        """
+    )
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+episode_ingest.py
+
+Purpose:
+  Row mapping for playlistEpisodes (hot: ordering/planning columns) and
+  playlistEpisodeDetails (cold: summary and display strings), shared by
+  getEpisodes.py, webhookListener.py and the micro-benchmarks (microbench.py)
+  so all exercise the same insert path. ingest_show() is getEpisodes.py's
+  per-show loop; microbench.py's ingest_insert stage times the same function.
+"""
+
+import sys
+import math
+import sqlite3
+from typing import AbstractSet, Iterable, Optional, Tuple
+
+import episode_aggregates
+import missing_keys
+
+INSERT_EPISODE_SQL = """
+    INSERT INTO playlistEpisodes
+    (ratingKey, season, episode, releaseDate, duration,
+     watchedStatus, show_id, timeSlot)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_DETAILS_SQL = """
+    INSERT INTO playlistEpisodeDetails
+    (ratingKey, summary, title, episodeTitle)
+    VALUES (?, ?, ?, ?)
+"""
+
+# Same row shapes; replace an existing ratingKey (webhookListener.py)
+UPSERT_EPISODE_SQL = INSERT_EPISODE_SQL.replace("INSERT INTO", "INSERT OR REPLACE INTO", 1)
+UPSERT_DETAILS_SQL = INSERT_DETAILS_SQL.replace("INSERT INTO", "INSERT OR REPLACE INTO", 1)
+
+# Positions in the tuple returned by episode_row()
+COL_SEASON, COL_EPISODE, COL_RELEASED, COL_DURATION, COL_WATCHED, COL_SHOW, COL_SLOT = 1, 2, 3, 4, 5, 6, 7
+
+
+def episode_row(ep, show_id: int, slot: Optional[int]) -> Tuple:
+    """Map a plexapi Episode (or any object with the same attributes) to a playlistEpisodes tuple."""
+    # Duration is stored (rounded up) in minutes
+    duration_ms = getattr(ep, 'duration', 0) or 0
+    duration_minutes = math.ceil(duration_ms / 60000) if duration_ms else 0
+    return (
+        int(ep.ratingKey),
+        getattr(ep, 'parentIndex', None),
+        getattr(ep, 'index', None),
+        getattr(ep, 'originallyAvailableAt', None),
+        duration_minutes,
+        bool(getattr(ep, 'viewCount', 0)),
+        show_id,
+        slot,
+    )
+
+
+def episode_details(ep) -> Tuple:
+    """Map the same episode to a playlistEpisodeDetails tuple."""
+    return (
+        int(ep.ratingKey),
+        getattr(ep, 'summary', None),
+        getattr(ep, 'grandparentTitle', '') or '',
+        getattr(ep, 'title', '') or '',
+    )
+
+
+def ingest_show(conn: sqlite3.Connection, show_id: int, slot: Optional[int], episodes: Iterable,
+                dead_keys: AbstractSet[int] = frozenset()) -> Tuple[int, int]:
+    """
+    Insert one show's episodes (hot + cold rows), then its aggregate rows.
+    Keys in dead_keys that the listing contains are dropped from the missing
+    cache: Plex just listed them. Returns (episodes inserted, cache entries
+    dropped). Caller commits, so the show lands in one transaction.
+    """
+    cur = conn.cursor()
+    agg = episode_aggregates.ShowAggregate(show_id, slot)
+    listed_dead = []
+    inserted = 0
+    for ep in episodes:
+        if int(ep.ratingKey) in dead_keys:
+            listed_dead.append(int(ep.ratingKey))
+        try:
+            data = episode_row(ep, show_id, slot)
+            cur.execute(INSERT_EPISODE_SQL, data)
+            cur.execute(INSERT_DETAILS_SQL, episode_details(ep))
+            agg.add(data[COL_SEASON], data[COL_DURATION], data[COL_WATCHED], data[COL_RELEASED])
+            inserted += 1
+        except sqlite3.Error as e:
+            print(f"[WARN] Insert failed for episode {getattr(ep, 'title', '<unknown>')}: {e}", file=sys.stderr)
+    episode_aggregates.write_show(conn, agg)
+    return inserted, missing_keys.forget(conn, listed_dead)
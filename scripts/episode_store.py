@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+episode_store.py
+
+Purpose:
+  Compact in-memory store for the playlist ordering data. Instead of a list of
+  row tuples plus a dict of Python int lists (dozens of bytes per key), rows
+  live in parallel typed arrays:
+
+    rating_key  array('q')   show     array('q')   season    array('i')
+    slot        array('i')   episode  array('i')   duration  array('i')
+
+  about 32 bytes per episode in total. The store is filled by streaming the
+  cursor in fetchmany() chunks, so no full result list is ever materialized.
+  Grouping by timeSlot returns zero-copy memoryview slices when rows arrive
+  sorted by slot (the normal ORDER BY), and round_robin() interleaves them into
+  an array('q').
+
+Usage (memory/time benchmark against the old fetchall + dict-of-lists path):
+  python episode_store.py --bench 100000 1000000
+"""
+
+import sys
+import time
+import sqlite3
+import argparse
+import tracemalloc
+from array import array
+from typing import Dict, Sequence, Tuple
+
+ORDER_SQL = """
+SELECT ratingKey, timeSlot, show_id, season, episode, duration
+FROM playlistEpisodes
+ORDER BY timeSlot, show_id, season, episode
+"""
+
+# Same order, unwatched episodes only (served by the partial index idx_playlistEpisodes_unwatched)
+UNWATCHED_ORDER_SQL = """
+SELECT ratingKey, timeSlot, show_id, season, episode, duration
+FROM playlistEpisodes
+WHERE watchedStatus = 0
+ORDER BY timeSlot, show_id, season, episode
+"""
+
+FETCH_CHUNK = 5000
+
+# Stored for NULL show/season/episode/duration
+MISSING = -1
+
+# Column order: ratingKey, timeSlot, show_id, season, episode, duration
+_TYPECODES = ('q', 'i', 'q', 'i', 'i', 'i')
+
+
+class EpisodeStore:
+    __slots__ = ('rating_key', 'slot', 'show', 'season', 'episode', 'duration')
+
+    def __init__(self):
+        self.rating_key = array('q')
+        self.slot = array('i')
+        self.show = array('q')
+        self.season = array('i')
+        self.episode = array('i')
+        self.duration = array('i')
+
+    def __len__(self) -> int:
+        return len(self.rating_key)
+
+    def _columns(self) -> Tuple[array, ...]:
+        return (self.rating_key, self.slot, self.show, self.season, self.episode, self.duration)
+
+    def append(self, rating_key, slot, show, season, episode, duration) -> None:
+        """Append one row; a bad row raises and leaves every column untouched."""
+        values = (
+            int(rating_key),
+            int(slot),
+            int(show) if show is not None else MISSING,
+            int(season) if season is not None else MISSING,
+            int(episode) if episode is not None else MISSING,
+            int(duration) if duration is not None else MISSING,
+        )
+        n = len(self.rating_key)
+        try:
+            for target, value in zip(self._columns(), values):
+                target.append(value)
+        except OverflowError:
+            for target in self._columns():
+                del target[n:]
+            raise
+
+    def extend_rows(self, rows: Sequence[tuple]) -> None:
+        """
+        Append a chunk of rows column-wise (fast path); falls back to per-row
+        appends that skip bad rows if any value is NULL or not an integer.
+        """
+        try:
+            cols = [array(code, col) for code, col in zip(_TYPECODES, zip(*rows))]
+        except (TypeError, ValueError, OverflowError):
+            for row in rows:
+                try:
+                    self.append(*row)
+                except (TypeError, ValueError, OverflowError):
+                    continue
+            return
+        if len(cols) != len(_TYPECODES):
+            raise ValueError(f"expected {len(_TYPECODES)} columns per row")
+        for target, col in zip(self._columns(), cols):
+            target.extend(col)
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection, query: str = ORDER_SQL, params: Sequence = (),
+             chunk: int = FETCH_CHUNK) -> 'EpisodeStore':
+        """
+        Stream rows of (ratingKey, timeSlot, show_id, season, episode, duration)
+        into a new store. Rows with a NULL/non-integer ratingKey or timeSlot are skipped.
+        """
+        store = cls()
+        cur = conn.execute(query, params)
+        try:
+            while True:
+                rows = cur.fetchmany(chunk)
+                if not rows:
+                    break
+                store.extend_rows(rows)
+        finally:
+            cur.close()
+        return store
+
+    def group_by_slot(self) -> Dict[int, Sequence[int]]:
+        """
+        { timeSlot: ratingKeys in stored order }. Zero-copy memoryview slices
+        when rows are sorted by slot; per-slot arrays otherwise.
+        """
+        slots = self.slot
+        n = len(slots)
+        if n == 0:
+            return {}
+        if all(slots[i] <= slots[i + 1] for i in range(n - 1)):
+            view = memoryview(self.rating_key)
+            grouped: Dict[int, Sequence[int]] = {}
+            start = 0
+            for i in range(1, n + 1):
+                if i == n or slots[i] != slots[start]:
+                    grouped[slots[start]] = view[start:i]
+                    start = i
+            return grouped
+        buckets: Dict[int, array] = {}
+        for rk, slot in zip(self.rating_key, slots):
+            bucket = buckets.get(slot)
+            if bucket is None:
+                bucket = buckets[slot] = array('q')
+            bucket.append(rk)
+        return buckets
+
+
+def round_robin(grouped: Dict[int, Sequence[int]]) -> array:
+    """
+    Interleave sequences by index to produce a round-robin order.
+    grouped = { timeSlot: [ratingKey, ...], ... }
+    """
+    order = array('q')
+    if not grouped:
+        return order
+    lists = [grouped[k] for k in sorted(grouped.keys())]
+    max_len = max(len(v) for v in lists)
+    for i in range(max_len):
+        lists = [lst for lst in lists if i < len(lst)]
+        order.extend(lst[i] for lst in lists)
+    return order
+
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+SUMMARY_TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 6
+
+
+def synthetic_db(rows: int, shows: int = 40, wide: bool = False, details: bool = False) -> sqlite3.Connection:
+    """In-memory playlistEpisodes with the db_migrate.py layout and ordering index.
+
+    wide=True builds the pre-split layout instead (display text inline, index
+    without duration), for before/after scan comparisons. details=True fills in
+    summary/title/episodeTitle, which only the cold table (or wide rows) carry.
+    """
+    conn = sqlite3.connect(':memory:')
+    hot = ((100000 + i, (i // shows) // 20 + 1, (i // shows) % 20 + 1, 22 + i % 40, 1000 + i % shows, 1 + i % shows)
+           for i in range(rows))
+    text = ((100000 + i, SUMMARY_TEXT, f"Show {i % shows}", f"Episode {i // shows}") for i in range(rows))
+    if wide:
+        conn.execute("""
+            CREATE TABLE playlistEpisodes (
+              ratingKey INTEGER PRIMARY KEY, season INTEGER, episode INTEGER, releaseDate TEXT,
+              duration INTEGER, summary TEXT, watchedStatus BOOLEAN, title TEXT, episodeTitle TEXT,
+              show_id INTEGER, timeSlot INTEGER)
+        """)
+        if details:
+            conn.executemany(
+                "INSERT INTO playlistEpisodes (ratingKey, season, episode, duration, show_id, timeSlot, "
+                "summary, title, episodeTitle) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (h + t[1:] for h, t in zip(hot, text)),
+            )
+        else:
+            conn.executemany(
+                "INSERT INTO playlistEpisodes (ratingKey, season, episode, duration, show_id, timeSlot) "
+                "VALUES (?, ?, ?, ?, ?, ?)", hot)
+        conn.execute("CREATE INDEX idx_playlistEpisodes_slot_show ON playlistEpisodes(timeSlot, show_id, season, episode)")
+    else:
+        conn.executescript("""
+            CREATE TABLE playlistEpisodes (
+              ratingKey INTEGER PRIMARY KEY, season INTEGER, episode INTEGER, releaseDate TEXT,
+              duration INTEGER, watchedStatus BOOLEAN, show_id INTEGER, timeSlot INTEGER);
+            CREATE TABLE playlistEpisodeDetails (
+              ratingKey INTEGER PRIMARY KEY, summary TEXT, title TEXT, episodeTitle TEXT);
+        """)
+        conn.executemany(
+            "INSERT INTO playlistEpisodes (ratingKey, season, episode, duration, show_id, timeSlot) "
+            "VALUES (?, ?, ?, ?, ?, ?)", hot)
+        if details:
+            conn.executemany(
+                "INSERT INTO playlistEpisodeDetails (ratingKey, summary, title, episodeTitle) VALUES (?, ?, ?, ?)",
+                text)
+        conn.execute("CREATE INDEX idx_playlistEpisodes_slot_show "
+                     "ON playlistEpisodes(timeSlot, show_id, season, episode, duration)")
+    conn.commit()
+    return conn
+
+
+def _legacy(conn: sqlite3.Connection):
+    rows = conn.execute("SELECT ratingKey, timeSlot FROM playlistEpisodes ORDER BY timeSlot, show_id, season, episode").fetchall()
+    grouped: Dict[int, list] = {}
+    for rk, slot in rows:
+        grouped.setdefault(int(slot), []).append(int(rk))
+    order = []
+    keys = sorted(grouped)
+    for i in range(max(len(v) for v in grouped.values())):
+        for k in keys:
+            if i < len(grouped[k]):
+                order.append(grouped[k][i])
+    return rows, grouped, order
+
+
+def _store(conn: sqlite3.Connection):
+    store = EpisodeStore.load(conn)
+    grouped = store.group_by_slot()
+    return store, grouped, round_robin(grouped)
+
+
+def _measure(fn, conn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn(conn)
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, current, peak, result
+
+
+def bench(sizes) -> None:
+    print(f"{'rows':>9} {'path':>7} {'seconds':>8} {'held MiB':>9} {'peak MiB':>9}")
+    for n in sizes:
+        conn = synthetic_db(n)
+        orders = []
+        for name, fn in (('legacy', _legacy), ('store', _store)):
+            elapsed, held, peak, result = _measure(fn, conn)
+            orders.append(list(result[2]))
+            print(f"{n:>9} {name:>7} {elapsed:>8.2f} {held / 2**20:>9.1f} {peak / 2**20:>9.1f}")
+            del result
+        if orders[0] != orders[1]:
+            print("[ERROR] store and legacy orders differ", file=sys.stderr)
+            sys.exit(1)
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark EpisodeStore against the fetchall/dict-of-lists path.")
+    parser.add_argument("--bench", type=int, nargs='+', default=[100000, 1000000], metavar="ROWS")
+    bench(parser.parse_args().bench)
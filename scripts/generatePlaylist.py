@@ -3,11 +3,14 @@
 generatePlaylist.py
 
 Usage:
-  python generatePlaylist.py <playlist_ratingKey>
+  python generatePlaylist.py <playlist_ratingKey> [--planned] [--unwatched-only] [--profile]
 
 Purpose:
   Clears the specified Plex playlist and re-populates it in a round-robin order
   using episodes stored in SQLite (table: playlistEpisodes), grouped by timeSlot.
+  With --planned, the order saved by schedule_planner.py (table: plannedOrder)
+  is used instead. --unwatched-only leaves out episodes marked watched
+  (see refreshWatched.py).
 
 Environment:
   - .env in project root with:
@@ -22,7 +25,7 @@ Exit codes:
   2 -> .env missing or PLEX_* missing
   3 -> Plex connection failed
   4 -> Playlist fetch failed or not a playlist
-  5 -> SQLite DB missing or cannot open
+  5 -> SQLite DB missing or cannot open (or no saved plan with --planned)
   6 -> Failed to clear playlist
   7 -> Failed to add items
   0 -> Success
@@ -32,14 +35,25 @@ import os
 import sys
 import sqlite3
 import argparse
-from typing import Dict, List, Iterable
+from typing import List
 from urllib.parse import urlparse, urlunparse
 
-import requests
 from dotenv import load_dotenv
 from plexapi.server import PlexServer
 from plexapi.playlist import Playlist
 
+import profiling
+from plex_session import make_session
+from playlist_fill import fill_playlist
+from adaptive_batch import AdaptiveBatcher
+import missing_keys
+from db_migrate import migrate
+from episode_store import EpisodeStore, ORDER_SQL, UNWATCHED_ORDER_SQL, round_robin
+from schedule_planner import load_planned
+from pipeline_lock import hold_for_script
+
+profiling.enable_from_cli('generatePlaylist')
+
 # ---------------------------
 # Paths & .env loading
 # ---------------------------
@@ -83,40 +97,19 @@ PLEX_URL = remap_localhost_for_container(PLEX_URL)
 # ---------------------------
 parser = argparse.ArgumentParser(description="Clear and repopulate a Plex playlist from DB.")
 parser.add_argument("ratingKey", type=int, help="The ratingKey (numeric id) of the target playlist")
+parser.add_argument("--planned", action="store_true", help="Use the order saved by schedule_planner.py")
+parser.add_argument("--unwatched-only", action="store_true", help="Skip episodes marked watched")
 args = parser.parse_args()
 playlist_rating_key: int = args.ratingKey
 
-# ---------------------------
-# Helpers
-# ---------------------------
-def round_robin(grouped: Dict[int, List[int]]) -> List[int]:
-    """
-    Interleave lists by index to produce a round-robin order.
-    grouped = { timeSlot: [ratingKey, ...], ... }
-    """
-    if not grouped:
-        return []
-    keys = sorted(grouped.keys())
-    max_len = max(len(v) for v in grouped.values()) if grouped else 0
-    order: List[int] = []
-    for i in range(max_len):
-        for k in keys:
-            lst = grouped.get(k, [])
-            if i < len(lst):
-                order.append(lst[i])
-    return order
-
-def chunked(iterable: List, size: int) -> Iterable[List]:
-    """Yield lists of length <= size from iterable."""
-    for i in range(0, len(iterable), size):
-        yield iterable[i:i+size]
+# Serialize with any other pipeline run (no-op under runPipeline.py)
+hold_for_script()
 
 # ---------------------------
-# Connect to Plex (requests.Session controls SSL verify)
+# Connect to Plex (plex_session controls SSL verify and record/replay)
 # ---------------------------
 try:
-    session = requests.Session()
-    session.verify = True if PLEX_VERIFY_SSL else False
+    session = make_session(PLEX_VERIFY_SSL, 'generatePlaylist')
     plex = PlexServer(PLEX_URL, PLEX_TOKEN, session=session)
 except Exception as e:
     print(f"[ERROR] Failed to connect to Plex at {PLEX_URL}: {e}", file=sys.stderr)
@@ -136,6 +129,8 @@ except Exception as e:
     print(f"[ERROR] Could not fetch playlist with ratingKey {playlist_rating_key}: {e}", file=sys.stderr)
     sys.exit(4)
 
+profiling.phase('connect + fetch playlist')
+
 # ---------------------------
 # Connect to DB and read episodes
 # ---------------------------
@@ -145,43 +140,49 @@ if not os.path.exists(DB_PATH):
 
 try:
     conn = sqlite3.connect(DB_PATH)
+    migrate(conn)  # once per run; the helpers below hold no DDL
     cur = conn.cursor()
 except Exception as e:
     print(f"[ERROR] Could not open SQLite DB at {DB_PATH}: {e}", file=sys.stderr)
     sys.exit(5)
 
 try:
-    query = """
-    SELECT ratingKey, timeSlot
-    FROM playlistEpisodes
-    ORDER BY timeSlot, show_id, season, episode
-    """
-    cur.execute(query)
-    rows = cur.fetchall()
+    # Known-dead ratingKeys never reach Plex again (negative cache with TTL)
+    purged = missing_keys.purge(conn)
+    conn.commit()
+    if purged:
+        print(f"[INFO] Purged {purged} episodes Plex previously reported as missing.")
+
+    if args.planned:
+        # Time-budgeted order saved by schedule_planner.py
+        episode_order = load_planned(conn, args.unwatched_only)
+    else:
+        # Streamed into compact typed arrays (see episode_store.py), then
+        # grouped by timeSlot into round-robin order
+        store = EpisodeStore.load(conn, UNWATCHED_ORDER_SQL if args.unwatched_only else ORDER_SQL)
+        episode_order = round_robin(store.group_by_slot())
+        del store
 finally:
     cur.close()
     conn.close()
 
-if not rows:
+if episode_order is None:
+    print("[ERROR] No saved plan in plannedOrder; run schedule_planner.py first.", file=sys.stderr)
+    sys.exit(5)
+if not len(episode_order):
     print("[WARN] No episodes found in playlistEpisodes. Nothing to add.", file=sys.stderr)
-    rows = []
 
-# Group by timeSlot
-episodes_by_slot: Dict[int, List[int]] = {}
-for rating_key, slot in rows:
-    try:
-        rk_int = int(rating_key)
-        episodes_by_slot.setdefault(int(slot), []).append(rk_int)
-    except Exception:
-        continue
+# Batch sizes are tuned per server and remembered in the settings table
+server_id = str(getattr(plex, 'machineIdentifier', '') or PLEX_URL)
+add_batcher = AdaptiveBatcher(DB_PATH, server_id, 'add')
 
-# Produce round-robin order
-episode_order: List[int] = round_robin(episodes_by_slot)
 print(f"[INFO] Episodes to add (count): {len(episode_order)}")
+profiling.phase('read + order episodes')
 
 # ---------------------------
 # Clear existing items
 # ---------------------------
+# plexapi removes items one DELETE at a time, so there is nothing to batch here
 try:
     current_items = playlist.items()
     if current_items:
@@ -192,36 +193,36 @@ try:
 except Exception as e:
     print(f"[ERROR] Failed to clear existing playlist items: {e}", file=sys.stderr)
     sys.exit(6)
+profiling.phase('clear playlist')
 
 # ---------------------------
-# Fetch episodes & add in chunks
+# Fetch episodes & add in pipelined batches
 # ---------------------------
 if not episode_order:
     print("[INFO] No episodes to add. Leaving playlist empty.")
     sys.exit(0)
 
-items_to_add = []
-failed_fetch = 0
-for rk in episode_order:
+def forget_dead(keys: List[int]) -> None:
+    """Cache keys Plex no longer has and drop their playlistEpisodes rows."""
     try:
-        items_to_add.append(plex.fetchItem(rk))
-    except Exception as e:
-        failed_fetch += 1
-        print(f"[WARN] Could not fetch episode ratingKey={rk}: {e}", file=sys.stderr)
-
-print(f"[INFO] Fetched {len(items_to_add)} items; {failed_fetch} failed.")
+        with sqlite3.connect(DB_PATH) as dead_conn:
+            missing_keys.record_dead(dead_conn, keys)
+    except sqlite3.Error as e:
+        print(f"[WARN] Could not record missing ratingKeys: {e}", file=sys.stderr)
 
-added_total = 0
+# Resolver thread fetches batches into a bounded queue while this thread
+# uploads them, so only a handful of batches are ever held in memory.
 try:
-    for batch in chunked(items_to_add, 500):
-        if not batch:
-            continue
-        playlist.addItems(batch)
-        added_total += len(batch)
-        print(f"[INFO] Added {len(batch)} items (running total: {added_total})")
+    added_total, failed_fetch = fill_playlist(plex, playlist, episode_order,
+                                              batcher=add_batcher, on_dead=forget_dead)
 except Exception as e:
     print(f"[ERROR] Failed while adding items to playlist '{playlist.title}': {e}", file=sys.stderr)
+    add_batcher.save()
     sys.exit(7)
+add_batcher.save()
+print(f"[INFO] Tuned add batch size for this server: {add_batcher.size}")
 
+print(f"[INFO] Added {added_total} items; {failed_fetch} could not be fetched.")
+profiling.phase('add items')
 print(f"[SUCCESS] Added {added_total} episodes to playlist '{playlist.title}'.")
 sys.exit(0)
@@ -3,11 +3,14 @@
 getEpisodes.py
 
 Usage:
-  python getEpisodes.py
+  python getEpisodes.py [--profile]
 
 Purpose:
   Reads selected shows (id, timeSlot) from SQLite table `playlistShows`,
-  queries Plex for all episodes in those shows, and populates `playlistEpisodes`.
+  queries Plex for all episodes in those shows, and populates `playlistEpisodes`
+  (and the display text in `playlistEpisodeDetails`).
+  Per-show and per-timeSlot totals (showAggregates / slotAggregates) are
+  maintained as each show is ingested.
 
 Environment:
   - .env in project root with:
@@ -24,14 +27,22 @@ Exit codes:
 
 import os
 import sys
-import math
 import sqlite3
 from urllib.parse import urlparse, urlunparse
 
-import requests
 from dotenv import load_dotenv
 from plexapi.server import PlexServer
 
+import profiling
+from plex_session import make_session
+import missing_keys
+import episode_aggregates
+from db_migrate import migrate
+from episode_ingest import ingest_show
+from pipeline_lock import hold_for_script
+
+profiling.enable_from_cli('getEpisodes')
+
 # ---------------------------
 # Paths & .env loading
 # ---------------------------
@@ -70,12 +81,14 @@ def remap_localhost_for_container(url: str) -> str:
 # Remap if needed
 PLEX_URL = remap_localhost_for_container(PLEX_URL)
 
+# Serialize with any other pipeline run (no-op under runPipeline.py)
+hold_for_script()
+
 # ---------------------------
 # Connect to Plex
 # ---------------------------
 try:
-    session = requests.Session()
-    session.verify = True if PLEX_VERIFY_SSL else False
+    session = make_session(PLEX_VERIFY_SSL, 'getEpisodes')
     plex = PlexServer(PLEX_URL, PLEX_TOKEN, session=session)
     print("[INFO] Connected to Plex Server.")
 except Exception as e:
@@ -87,15 +100,23 @@ except Exception as e:
 # ---------------------------
 try:
     db_conn = sqlite3.connect(DB_FILE)
+    # Once per run, before any table is touched: splits a pre-split
+    # playlistEpisodes and creates the details/aggregate tables if needed
+    migrate(db_conn)
     cursor = db_conn.cursor()
     print("[INFO] Connected to SQLite DB.")
 except sqlite3.Error as e:
     print(f"[ERROR] SQLite connect failed: {e}", file=sys.stderr)
     sys.exit(1)
 
-# Clear the table before refilling
+profiling.phase('connect')
+
+# Clear the tables (and aggregates) before refilling. Details go first: that
+# table has no triggers, so SQLite truncates it instead of deleting row by row.
 try:
+    cursor.execute("DELETE FROM playlistEpisodeDetails")
     cursor.execute("DELETE FROM playlistEpisodes")
+    episode_aggregates.clear(db_conn)
     db_conn.commit()
     print("[INFO] Cleared playlistEpisodes.")
 except sqlite3.Error as e:
@@ -111,6 +132,7 @@ cursor.execute("SELECT id, timeSlot FROM playlistShows")
 rows = cursor.fetchall()
 shows_from_db = {int(rk): ts for rk, ts in rows}
 print(f"[INFO] Selected shows: {len(shows_from_db)}")
+profiling.phase('clear + read selection')
 
 # ---------------------------
 # Gather TV libraries (type == 'show')
@@ -119,7 +141,12 @@ tv_sections = [s for s in plex.library.sections() if getattr(s, 'type', '') == '
 if not tv_sections:
     print("[WARN] No TV Show libraries found.")
 
+# ratingKeys Plex recently reported as missing (see missing_keys.py). Listing
+# one in show.episodes() proves it exists, so its cache entry is dropped.
+dead_keys = missing_keys.known_dead(db_conn)
+
 matched_shows = 0
+revived = 0
 total_episodes_processed = 0
 
 for section in tv_sections:
@@ -134,39 +161,22 @@ for section in tv_sections:
             continue
 
         matched_shows += 1
-        slot = shows_from_db[rk]
-
-        for ep in show.episodes():
-            try:
-                # Duration is stored (rounded up) in minutes
-                duration_ms = getattr(ep, 'duration', 0) or 0
-                duration_minutes = math.ceil(duration_ms / 60000) if duration_ms else 0
-
-                insert_stmt = ("""
-                    INSERT INTO playlistEpisodes
-                    (ratingKey, season, episode, releaseDate, duration, summary,
-                     watchedStatus, title, episodeTitle, show_id, timeSlot)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """)
-                data = (
-                    int(ep.ratingKey),
-                    getattr(ep, 'parentIndex', None),
-                    getattr(ep, 'index', None),
-                    getattr(ep, 'originallyAvailableAt', None),
-                    duration_minutes,
-                    getattr(ep, 'summary', None),
-                    bool(getattr(ep, 'viewCount', 0)),
-                    getattr(ep, 'grandparentTitle', '') or '',
-                    getattr(ep, 'title', '') or '',
-                    rk,
-                    slot
-                )
-                cursor.execute(insert_stmt, data)
-                db_conn.commit()
-                total_episodes_processed += 1
-            except sqlite3.Error as e:
-                print(f"[WARN] Insert failed for episode {getattr(ep, 'title', '<unknown>')}: {e}", file=sys.stderr)
 
+        # Show's episodes and its aggregate rows land in one transaction
+        try:
+            inserted, forgotten = ingest_show(db_conn, rk, shows_from_db[rk], show.episodes(), dead_keys)
+            total_episodes_processed += inserted
+            revived += forgotten
+            db_conn.commit()
+        except sqlite3.Error as e:
+            print(f"[ERROR] Could not commit episodes for show {getattr(show, 'title', rk)}: {e}", file=sys.stderr)
+            cursor.close()
+            db_conn.close()
+            sys.exit(1)
+
+profiling.phase('ingest episodes')
+if revived:
+    print(f"[INFO] {revived} episodes cached as missing are listed by Plex again; kept them.")
 print(f"[SUCCESS] DB update complete. {matched_shows} shows matched. {total_episodes_processed} episodes processed.")
 
 cursor.close()
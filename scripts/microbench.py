@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+microbench.py
+
+Usage:
+  python microbench.py [--scales 1000 10000 100000 1000000] [--stages round_robin chunked ...]
+                       [--repeat 3] [--threshold 0.25] [--mem-threshold 0.25]
+                       [--baseline logs/microbench_baseline.json] [--save-baseline]
+
+Purpose:
+  Micro-benchmarks for the CPU-bound, Plex-free stages of the pipeline, run on
+  synthetic data at several scales:
+
+    round_robin    episode_store.round_robin() over per-slot ratingKeys
+    chunked        playlist_fill.chunked() over the ordered keys (batches of 500)
+    group_by_slot  EpisodeStore.group_by_slot()
+    ingest_insert  episode_ingest.ingest_show(), getEpisodes.py's per-show insert
+                   loop (rows + details + aggregates, one commit per show)
+    order_query    ORDER BY timeSlot, show_id, season, episode via the covering
+                   idx_playlistEpisodes_slot_show, streamed into an EpisodeStore
+    scan_wide      order_query against the pre-split layout: summaries and
+                   titles inline, index without duration (before)
+    scan_split     order_query against the hot/cold layout with the same text
+                   in playlistEpisodeDetails (after)
+
+  Each stage/scale records the best wall time of --repeat runs and, in a
+  separate run under tracemalloc, the peak traced memory. Results go to
+  logs/microbench_<timestamp>.json. With a baseline file present, any stage
+  slower (or hungrier) than baseline * (1 + threshold) is reported and the
+  exit code is 1. --save-baseline writes the current results as the baseline.
+
+Environment (optional; .env in project root or the shell):
+  MICROBENCH_THRESHOLD      default for --threshold
+  MICROBENCH_MEM_THRESHOLD  default for --mem-threshold
+
+Exit codes:
+  1 -> Regression against the baseline
+  0 -> Success (or no baseline to compare against)
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import sqlite3
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+
+from episode_store import EpisodeStore, round_robin, synthetic_db
+from playlist_fill import chunked
+from episode_ingest import ingest_show
+from db_migrate import migrate
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LOG_DIR = os.path.join(ROOT, 'logs')
+ENV_PATH = os.path.join(ROOT, '.env')
+DEFAULT_BASELINE = os.path.join(LOG_DIR, 'microbench_baseline.json')
+
+SHOWS = 40
+
+# Measurements below these are too noisy to gate on
+MIN_GATED_SECONDS = 0.005
+MIN_GATED_BYTES = 256 * 1024
+
+
+# ---------------------------
+# Stage setups: each returns a zero-arg callable that does the measured work
+# ---------------------------
+def setup_round_robin(n: int) -> Callable[[], object]:
+    grouped = EpisodeStore.load(synthetic_db(n, SHOWS)).group_by_slot()
+    return lambda: round_robin(grouped)
+
+
+def setup_chunked(n: int) -> Callable[[], object]:
+    order = round_robin(EpisodeStore.load(synthetic_db(n, SHOWS)).group_by_slot())
+    return lambda: sum(len(batch) for batch in chunked(order, 500))
+
+
+def setup_group_by_slot(n: int) -> Callable[[], object]:
+    store = EpisodeStore.load(synthetic_db(n, SHOWS))
+    return store.group_by_slot
+
+
+def setup_ingest_insert(n: int) -> Callable[[], object]:
+    per_show = max(1, n // SHOWS)
+    shows = [
+        (1000 + s, 1 + s, [
+            SimpleNamespace(
+                ratingKey=100000 + s * per_show + i, parentIndex=i // 20 + 1, index=i % 20 + 1,
+                originallyAvailableAt=f"20{10 + i % 10}-01-{1 + i % 28:02d}", duration=1320000 + i,
+                summary="Lorem ipsum dolor sit amet " * 8, viewCount=i % 3, grandparentTitle=f"Show {s}",
+                title=f"Episode {i}",
+            )
+            for i in range(per_show)
+        ])
+        for s in range(SHOWS)
+    ]
+
+    # Migrated once here, outside the timing; each run starts from a copy of
+    # the empty schema, like a fresh ingest
+    template = synthetic_db(0)
+    migrate(template)
+
+    def run():
+        conn = sqlite3.connect(':memory:')
+        template.backup(conn)
+        for show_id, slot, episodes in shows:
+            ingest_show(conn, show_id, slot, episodes)
+            conn.commit()
+        conn.close()
+    return run
+
+
+def setup_order_query(n: int) -> Callable[[], object]:
+    conn = synthetic_db(n, SHOWS)
+    return lambda: len(EpisodeStore.load(conn))
+
+
+def setup_scan_wide(n: int) -> Callable[[], object]:
+    conn = synthetic_db(n, SHOWS, wide=True, details=True)
+    return lambda: len(EpisodeStore.load(conn))
+
+
+def setup_scan_split(n: int) -> Callable[[], object]:
+    conn = synthetic_db(n, SHOWS, details=True)
+    return lambda: len(EpisodeStore.load(conn))
+
+
+STAGES: Dict[str, Callable[[int], Callable[[], object]]] = {
+    'round_robin': setup_round_robin,
+    'chunked': setup_chunked,
+    'group_by_slot': setup_group_by_slot,
+    'ingest_insert': setup_ingest_insert,
+    'order_query': setup_order_query,
+    'scan_wide': setup_scan_wide,
+    'scan_split': setup_scan_split,
+}
+
+
+# ---------------------------
+# Measurement
+# ---------------------------
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, mem_threshold: float) -> List[str]:
+    problems = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if base["seconds"] >= MIN_GATED_SECONDS and cur["seconds"] > base["seconds"] * (1 + threshold):
+            problems.append(f"{key}: {cur['seconds']:.4f}s vs baseline {base['seconds']:.4f}s "
+                            f"(+{cur['seconds'] / base['seconds'] - 1:.0%})")
+        if base["peak_bytes"] >= MIN_GATED_BYTES and cur["peak_bytes"] > base["peak_bytes"] * (1 + mem_threshold):
+            problems.append(f"{key}: peak {cur['peak_bytes'] / 2**20:.1f} MiB vs baseline "
+                            f"{base['peak_bytes'] / 2**20:.1f} MiB (+{cur['peak_bytes'] / base['peak_bytes'] - 1:.0%})")
+    return problems
+
+
+def main() -> int:
+    if os.path.exists(ENV_PATH):
+        load_dotenv(ENV_PATH, override=True)
+
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the pure-Python pipeline stages.")
+    parser.add_argument("--scales", type=int, nargs='+', default=[1000, 10000, 100000], metavar="EPISODES")
+    parser.add_argument("--stages", nargs='+', choices=sorted(STAGES), default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=float(os.getenv('MICROBENCH_THRESHOLD', '0.25') or 0.25),
+                        help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--mem-threshold", type=float,
+                        default=float(os.getenv('MICROBENCH_MEM_THRESHOLD', '0.25') or 0.25),
+                        help="Allowed peak-memory growth vs baseline")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'stage':>14} {'episodes':>9} {'seconds':>9} {'peak MiB':>9}")
+    for stage in args.stages:
+        for n in args.scales:
+            fn = STAGES[stage](n)
+            r = measure(fn, max(1, args.repeat))
+            results[f"{stage}@{n}"] = r
+            print(f"{stage:>14} {n:>9} {r['seconds']:>9.4f} {r['peak_bytes'] / 2**20:>9.1f}")
+            del fn
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    os.makedirs(LOG_DIR, exist_ok=True)
+    out_path = os.path.join(LOG_DIR, f"microbench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2)
+    print(f"[INFO] Results written to {out_path}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        print(f"[SUCCESS] Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"[INFO] No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as fh:
+        baseline = json.load(fh).get("results", {})
+    problems = compare(results, baseline, args.threshold, args.mem_threshold)
+    if problems:
+        for p in problems:
+            print(f"[ERROR] Regression: {p}", file=sys.stderr)
+        return 1
+    print(f"[SUCCESS] No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
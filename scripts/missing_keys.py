@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+missing_keys.py
+
+Purpose:
+  Negative cache for episode ratingKeys that Plex no longer knows about
+  (episode deleted or re-matched to a new ratingKey).
+
+  - record_dead(): remember keys Plex answered "not found" for and purge their
+    rows from playlistEpisodes.
+  - purge(): drop playlistEpisodes rows for keys still inside the TTL, so
+    readers never hand them to Plex again. Expired entries are forgotten and
+    get one fresh round trip on the next run.
+  - known_dead() / forget(): a full ingest that sees a cached key in a show's
+    episode listing proves it exists again, so it forgets the entry and keeps
+    the episode. Only playlist generation trusts the cache to skip round trips.
+
+  Both purge paths refresh the aggregates (episode_aggregates.py) of the shows
+  they removed rows from. missingRatingKeys is defined in db_migrate.py;
+  scripts run migrate() once at startup, so nothing here issues DDL.
+
+Environment (optional; read on every call, so values from .env apply):
+  PLEX_MISSING_TTL_HOURS  how long a missing key is trusted as dead (default 168)
+"""
+
+import os
+import time
+import sqlite3
+from typing import Iterable, Set
+
+import episode_aggregates
+
+DEFAULT_TTL_HOURS = 168.0
+
+
+def ttl_seconds() -> float:
+    try:
+        hours = float(os.getenv('PLEX_MISSING_TTL_HOURS', '') or DEFAULT_TTL_HOURS)
+    except ValueError:
+        hours = DEFAULT_TTL_HOURS
+    return hours * 3600
+
+
+def _cutoff() -> float:
+    return time.time() - ttl_seconds()
+
+
+def known_dead(conn: sqlite3.Connection) -> Set[int]:
+    """ratingKeys confirmed missing within the TTL."""
+    rows = conn.execute("SELECT ratingKey FROM missingRatingKeys WHERE last_checked >= ?", (_cutoff(),))
+    return {int(rk) for (rk,) in rows}
+
+
+def purge(conn: sqlite3.Connection) -> int:
+    """
+    Forget expired entries and delete playlistEpisodes rows for keys still
+    known dead. Returns the number of episode rows removed. Caller commits.
+    """
+    conn.execute("DELETE FROM missingRatingKeys WHERE last_checked < ?", (_cutoff(),))
+    shows = [show_id for (show_id,) in conn.execute(
+        "SELECT DISTINCT show_id FROM playlistEpisodes "
+        "WHERE ratingKey IN (SELECT ratingKey FROM missingRatingKeys) AND show_id IS NOT NULL"
+    )]
+    cur = conn.execute(
+        "DELETE FROM playlistEpisodes WHERE ratingKey IN (SELECT ratingKey FROM missingRatingKeys)"
+    )
+    episode_aggregates.refresh_shows(conn, shows)
+    return cur.rowcount or 0
+
+
+def forget(conn: sqlite3.Connection, keys: Iterable[int]) -> int:
+    """Drop cache entries for keys Plex has listed again. Caller commits."""
+    keys = [int(k) for k in keys]
+    conn.executemany("DELETE FROM missingRatingKeys WHERE ratingKey = ?", [(k,) for k in keys])
+    return len(keys)
+
+
+def record_dead(conn: sqlite3.Connection, keys: Iterable[int]) -> int:
+    """Remember keys as missing and purge their episode rows. Commits."""
+    keys = [int(k) for k in keys]
+    if not keys:
+        return 0
+    now = time.time()
+    conn.executemany(
+        """
+        INSERT INTO missingRatingKeys (ratingKey, show_id, first_missing, last_checked)
+        VALUES (?, (SELECT show_id FROM playlistEpisodes WHERE ratingKey = ?), ?, ?)
+        ON CONFLICT(ratingKey) DO UPDATE SET last_checked = excluded.last_checked
+        """,
+        [(k, k, now, now) for k in keys],
+    )
+    shows = {show_id for k in keys for (show_id,) in conn.execute(
+        "SELECT show_id FROM playlistEpisodes WHERE ratingKey = ? AND show_id IS NOT NULL", (k,))}
+    conn.executemany("DELETE FROM playlistEpisodes WHERE ratingKey = ?", [(k,) for k in keys])
+    episode_aggregates.refresh_shows(conn, shows)
+    conn.commit()
+    return len(keys)
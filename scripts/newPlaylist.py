@@ -3,15 +3,26 @@
 newPlaylist.py
 
 Usage:
-  python newPlaylist.py
+  python newPlaylist.py [--fill [--planned] [--unwatched-only]] [--profile]
 
 Purpose:
-  Creates a new (initially empty) Plex playlist and prints JSON:
+  Creates a new Plex playlist and prints JSON:
     {"ok": true, "ratingKey": 12345, "title": "TV Playlist 2025-08-27 13:45:02"}
 
+  Default: the playlist is left empty for generatePlaylist.py to fill.
+  --fill: the round-robin order is computed here, the playlist is created with
+  its first few episodes (SEED_BATCH) and the rest is appended in pipelined,
+  adaptively sized batches (same as generatePlaylist.py), so no seed item is
+  added and removed and no separate clear is needed. The JSON then also
+  carries "filled": true, "added", "failed".
+  --planned (with --fill): fill in the order saved by schedule_planner.py.
+  --unwatched-only (with --fill): leave out episodes marked watched.
+
 Notes:
-  - Plex requires items at creation time. We seed with one episode, then clear it.
-  - generatePlaylist.py will fill the playlist afterward.
+  - Plex requires items at creation time. Without --fill we seed with one
+    episode, then clear it.
+  - If playlistEpisodes is empty, the seed is the first episode of the first
+    TV library (a size-1 query).
 
 Environment:
   - .env in project root with:
@@ -22,10 +33,11 @@ Environment:
 Exit codes:
   2 -> .env missing or PLEX_* missing
   3 -> Plex connection failed
-  4 -> DB missing / query failed
+  4 -> DB missing / query failed (or no saved plan with --planned)
   5 -> No seed episode found
   6 -> Couldn’t fetch seed item
   7 -> Playlist creation failed
+  8 -> Filling the playlist failed (--fill)
   0 -> Success
 """
 
@@ -33,14 +45,35 @@ import os
 import sys
 import json
 import sqlite3
+import argparse
 from datetime import datetime
-from typing import Optional
+from itertools import islice
+from typing import List, Optional
 
-import requests
 from dotenv import load_dotenv
 from plexapi.server import PlexServer
 from urllib.parse import urlparse, urlunparse
 
+import profiling
+from plex_session import make_session
+import missing_keys
+from db_migrate import migrate
+from pipeline_lock import hold_for_script
+from episode_store import EpisodeStore, ORDER_SQL, UNWATCHED_ORDER_SQL, round_robin
+from schedule_planner import load_planned
+from playlist_fill import chunked, fill_playlist, resolve_batch
+from adaptive_batch import AdaptiveBatcher
+
+profiling.enable_from_cli('newPlaylist')
+
+parser = argparse.ArgumentParser(description="Create a new Plex playlist (optionally filled in the same pass).")
+parser.add_argument("--fill", action="store_true", help="Create the playlist with the computed episode order")
+parser.add_argument("--planned", action="store_true", help="With --fill: use the order saved by schedule_planner.py")
+parser.add_argument("--unwatched-only", action="store_true", help="With --fill: skip episodes marked watched")
+args = parser.parse_args()
+if (args.planned or args.unwatched_only) and not args.fill:
+    parser.error("--planned and --unwatched-only require --fill")
+
 # ----------------------
 # Paths & environment
 # ----------------------
@@ -48,6 +81,9 @@ ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 ENV_PATH = os.path.join(ROOT, '.env')
 DB_PATH = os.path.join(ROOT, 'database', 'plex_playlist.db')
 
+# Episodes passed to createPlaylist with --fill (the rest go through fill_playlist)
+SEED_BATCH = 25
+
 def jerr(msg: str, code: int) -> None:
     """Print a JSON error and exit with code."""
     print(json.dumps({"ok": False, "error": msg}))
@@ -82,65 +118,143 @@ def remap_localhost_for_container(url: str) -> str:
 # Remap if needed
 PLEX_URL = remap_localhost_for_container(PLEX_URL)
 
+# Serialize with any other pipeline run (no-op under runPipeline.py)
+hold_for_script()
+
 # ----------------------
 # Connect to Plex
 # ----------------------
 try:
-    session = requests.Session()
-    session.verify = True if PLEX_VERIFY_SSL else False  # disable verification for plex.direct/self-signed if false
+    session = make_session(PLEX_VERIFY_SSL, 'newPlaylist')
     plex = PlexServer(PLEX_URL, PLEX_TOKEN, session=session)
 except Exception as e:
     jerr(f"Plex connect failed: {e}", 3)
 
+profiling.phase('connect')
+
 # ----------------------
-# Get a seed episode
+# Read the episode order (--fill) or a seed episode
 # ----------------------
 seed_key: Optional[int] = None
+episode_order = None
 
 if not os.path.exists(DB_PATH):
     jerr(f"DB not found at {DB_PATH}", 4)
 
 try:
     conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT ratingKey
-        FROM playlistEpisodes
-        ORDER BY timeSlot, show_id, season, episode
-        LIMIT 1
-    """)
-    row = cur.fetchone()
-    seed_key = int(row[0]) if row else None
+    migrate(conn)  # once per run; the helpers below hold no DDL
+    missing_keys.purge(conn)
+    conn.commit()
+    if args.planned:
+        episode_order = load_planned(conn, args.unwatched_only)
+        if episode_order is None:
+            jerr("No saved plan in plannedOrder; run schedule_planner.py first.", 4)
+        seed_key = episode_order[0] if episode_order else None
+    elif args.fill:
+        query = UNWATCHED_ORDER_SQL if args.unwatched_only else ORDER_SQL
+        episode_order = round_robin(EpisodeStore.load(conn, query).group_by_slot())
+        seed_key = episode_order[0] if episode_order else None
+    else:
+        row = conn.execute("""
+            SELECT ratingKey
+            FROM playlistEpisodes
+            ORDER BY timeSlot, show_id, season, episode
+            LIMIT 1
+        """).fetchone()
+        seed_key = int(row[0]) if row else None
 except Exception as e:
     jerr(f"DB query failed: {e}", 4)
 finally:
     try:
-        cur.close()
         conn.close()
     except Exception:
         pass
 
-# Fallback: ask Plex for any episode if DB is empty
+# Fallback: ask Plex for one episode if the DB is empty (size-1 query per TV library)
 if seed_key is None:
+    episode_order = None
     try:
-        eps = plex.library.search(libtype='episode')
-        if eps:
-            try:
+        for section in plex.library.sections():
+            if getattr(section, 'type', '') != 'show':
+                continue
+            eps = section.search(libtype='episode', maxresults=1)
+            if eps:
                 seed_key = int(eps[0].ratingKey)
-            except Exception:
-                seed_key = None
+                break
     except Exception:
         seed_key = None
 
 if seed_key is None:
     jerr("No episode found to seed playlist creation.", 5)
 
-# ----------------------
-# Create the playlist
-# ----------------------
+profiling.phase('find seed' if episode_order is None else 'read + order episodes')
+
 now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 playlist_name = f"TV Playlist {now}"
 
+
+def forget_dead(keys: List[int]) -> None:
+    """Cache keys Plex no longer has and drop their playlistEpisodes rows."""
+    try:
+        with sqlite3.connect(DB_PATH) as dead_conn:
+            missing_keys.record_dead(dead_conn, keys)
+    except sqlite3.Error as e:
+        print(f"[WARN] Could not record missing ratingKeys: {e}", file=sys.stderr)
+
+
+# ----------------------
+# Create + fill in one pass (--fill)
+# ----------------------
+if episode_order is not None:
+    server_id = str(getattr(plex, 'machineIdentifier', '') or PLEX_URL)
+    add_batcher = AdaptiveBatcher(DB_PATH, server_id, 'add')
+
+    # createPlaylist has no shrink/retry path, so it only gets a small seed batch
+    # (the first one that resolves); the adaptive batcher appends everything else
+    first_items: List = []
+    consumed = 0
+    failed = 0
+    try:
+        for keys in chunked(episode_order, SEED_BATCH):
+            consumed += len(keys)
+            first_items, missing, dead = resolve_batch(plex, keys)
+            failed += len(missing)
+            if dead:
+                forget_dead(dead)
+            if first_items:
+                break
+    except Exception as e:
+        jerr(f"Failed to fetch the first batch of episodes: {e}", 6)
+    if not first_items:
+        jerr("None of the episodes in playlistEpisodes could be fetched from Plex.", 6)
+
+    try:
+        pl = plex.createPlaylist(title=playlist_name, items=first_items)
+    except Exception as e:
+        jerr(f"Playlist creation failed: {e}", 7)
+    added = len(first_items)
+    del first_items
+    print(f"[INFO] Created '{pl.title}' with {added} episodes; appending {len(episode_order) - consumed} more.",
+          file=sys.stderr)
+    profiling.phase('create playlist')
+
+    try:
+        more, more_failed = fill_playlist(plex, pl, islice(episode_order, consumed, None),
+                                          batcher=add_batcher, on_dead=forget_dead)
+    except Exception as e:
+        add_batcher.save()
+        jerr(f"Failed while adding items to playlist '{pl.title}' (ratingKey={pl.ratingKey}): {e}", 8)
+    add_batcher.save()
+    profiling.phase('add items')
+
+    print(json.dumps({"ok": True, "ratingKey": int(pl.ratingKey), "title": pl.title,
+                      "filled": True, "added": added + more, "failed": failed + more_failed}))
+    sys.exit(0)
+
+# ----------------------
+# Create the playlist (seed, then clear)
+# ----------------------
 try:
     seed_item = plex.fetchItem(seed_key)
 except Exception as e:
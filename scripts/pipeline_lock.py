@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+pipeline_lock.py
+
+Purpose:
+  Advisory lock shared by every script that rewrites playlistEpisodes or
+  creates/fills playlists, so two pipeline runs never interleave.
+
+  - runPipeline.py takes the lock for the whole getEpisodes -> newPlaylist ->
+    generatePlaylist sequence and exports PIPELINE_LOCK_HELD=1 to its children.
+  - Scripts started by hand take the same lock themselves (blocking) unless
+    PIPELINE_LOCK_HELD is set.
+
+  The lock is an flock() on database/pipeline.lock; the kernel drops it when the
+  holding process exits, so a crashed run can never wedge the pipeline.
+"""
+
+import os
+import sys
+import fcntl
+import hashlib
+import sqlite3
+from typing import Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LOCK_PATH = os.path.join(ROOT, 'database', 'pipeline.lock')
+HELD_ENV = 'PIPELINE_LOCK_HELD'
+
+_held_fd: Optional[int] = None
+
+
+def _open_lock_file() -> int:
+    os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+    return os.open(LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o664)
+
+
+def acquire(blocking: bool = True) -> bool:
+    """
+    Take the pipeline lock for the rest of this process' lifetime.
+    Returns False only when blocking=False and another process holds it.
+    """
+    global _held_fd
+    if _held_fd is not None:
+        return True
+    fd = _open_lock_file()
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else (fcntl.LOCK_EX | fcntl.LOCK_NB))
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    _held_fd = fd
+    return True
+
+
+def release() -> None:
+    """Release the lock early (it is released on exit anyway)."""
+    global _held_fd
+    if _held_fd is None:
+        return
+    try:
+        fcntl.flock(_held_fd, fcntl.LOCK_UN)
+    finally:
+        os.close(_held_fd)
+        _held_fd = None
+
+
+def is_locked() -> bool:
+    """True if some other process currently holds the pipeline lock."""
+    if _held_fd is not None:
+        return False
+    fd = _open_lock_file()
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+def hold_for_script() -> None:
+    """
+    Called at the top of pipeline scripts. No-op when the coordinator already
+    holds the lock on our behalf; otherwise waits for any in-flight run.
+    """
+    if os.getenv(HELD_ENV, '').strip() == '1':
+        return
+    if not acquire(blocking=False):
+        print("[INFO] Another pipeline run is in progress; waiting for it to finish...", file=sys.stderr)
+        acquire(blocking=True)
+
+
+def inputs_fingerprint(conn: sqlite3.Connection) -> str:
+    """
+    Hash of everything the pipeline reads as input: the selected shows and
+    their timeslots. Identical fingerprints mean identical Plex work.
+    """
+    h = hashlib.sha256()
+    for show_id, slot in conn.execute("SELECT id, timeSlot FROM playlistShows ORDER BY id"):
+        h.update(f"{show_id}:{slot};".encode())
+    return h.hexdigest()
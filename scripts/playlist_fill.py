@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+playlist_fill.py
+
+Purpose:
+  Pipelined playlist fill shared by the playlist scripts.
+
+  A resolver thread turns the ordered ratingKeys into Plex Episode objects one
+  batch at a time (a single /library/metadata/k1,k2,... request per batch) and
+  puts the batches, in order, on a bounded queue. The calling thread uploads
+  each batch with playlist.addItems(). Fetching and uploading overlap, and at
+  most QUEUE_DEPTH + 2 batches of plexapi objects are alive at once no matter
+  how long the playlist is.
+
+  With an AdaptiveBatcher (adaptive_batch.py) the resolver follows the tuned
+  batch size and uploads go through batcher.run(), which shrinks and retries
+  on failures after checking whether the timed-out batch actually landed.
+"""
+
+import sys
+import queue
+import threading
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from plexapi.exceptions import NotFound
+
+BATCH_SIZE = 500
+QUEUE_DEPTH = 4
+
+_DONE = object()
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield lists of length <= size from iterable."""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def resolve_batch(plex, keys: Sequence[int]) -> Tuple[List, List[int], List[int]]:
+    """
+    Fetch the episodes for keys in one request, preserving order.
+    Returns (items, missing_keys, dead_keys). Falls back to per-key fetches if
+    the bulk request fails, so a single bad key does not sink the batch.
+    dead_keys is the subset Plex positively reported as not found (as opposed
+    to timeouts and other transient errors).
+    """
+    errors = {}
+    try:
+        by_key = {int(it.ratingKey): it for it in plex.fetchItems(list(keys))}
+    except Exception:
+        by_key = {}
+        for rk in keys:
+            try:
+                by_key[rk] = plex.fetchItem(rk)
+            except Exception as e:
+                errors[rk] = e
+    items, missing, dead = [], [], []
+    for rk in keys:
+        item = by_key.get(rk)
+        if item is None:
+            reason = errors.get(rk, 'not returned by Plex')
+            print(f"[WARN] Could not fetch episode ratingKey={rk}: {reason}", file=sys.stderr)
+            missing.append(rk)
+            if rk not in errors or isinstance(errors[rk], NotFound):
+                dead.append(rk)
+        else:
+            items.append(item)
+    return items, missing, dead
+
+
+def _resolver(plex, order: Iterable[int], batch_size: Union[int, Callable[[], int]],
+              out: "queue.Queue", stop: threading.Event) -> None:
+    try:
+        it = iter(order)
+        while not stop.is_set():
+            keys = list(islice(it, batch_size() if callable(batch_size) else batch_size))
+            if not keys:
+                break
+            batch = resolve_batch(plex, keys)
+            while not stop.is_set():
+                try:
+                    out.put(batch, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+        else:
+            return
+    except BaseException as e:  # surfaced to the uploader
+        out.put(e)
+        return
+    out.put(_DONE)
+
+
+def fill_playlist(plex, playlist, order: Iterable[int],
+                  batch_size: int = BATCH_SIZE, queue_depth: int = QUEUE_DEPTH,
+                  batcher=None, on_dead: Optional[Callable[[List[int]], None]] = None) -> Tuple[int, int]:
+    """
+    Append the episodes in `order` to `playlist`. Returns (added, failed_fetch).
+    Exceptions from playlist.addItems propagate to the caller. `on_dead` is
+    called on the calling thread with keys Plex reported as not found.
+    """
+    # Playlist length we believe the server has; used to tell whether a
+    # failed/timed-out addItems call was applied anyway. Reloaded first: the
+    # caller's object may predate a clear, and a stale count would make
+    # recover() resend batches that did land.
+    playlist.reload()
+    landed = [int(getattr(playlist, 'leafCount', 0) or 0)]
+
+    def send(items: List) -> None:
+        playlist.addItems(items)
+        landed[0] += len(items)
+
+    def recover(items: List) -> List:
+        playlist.reload()
+        now = int(getattr(playlist, 'leafCount', 0) or 0)
+        if now >= landed[0] + len(items):
+            landed[0] = now
+            return []
+        return items
+
+    if batcher is not None:
+        def batch_size() -> int:  # resolver follows the tuned size
+            return batcher.size
+
+    batches: "queue.Queue" = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    worker = threading.Thread(
+        target=_resolver, args=(plex, order, batch_size, batches, stop),
+        name='playlist-resolver', daemon=True,
+    )
+    worker.start()
+
+    added_total = 0
+    failed_fetch = 0
+    try:
+        while True:
+            got = batches.get()
+            if got is _DONE:
+                break
+            if isinstance(got, BaseException):
+                raise got
+            items, missing, dead = got
+            failed_fetch += len(missing)
+            if dead and on_dead is not None:
+                on_dead(dead)
+            if not items:
+                continue
+            if batcher is not None:
+                batcher.run(items, send, recover)
+            else:
+                send(items)
+            added_total += len(items)
+            print(f"[INFO] Added {len(items)} items (running total: {added_total})")
+    finally:
+        stop.set()
+        worker.join(timeout=5)
+
+    return added_total, failed_fetch
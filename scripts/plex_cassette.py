@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+plex_cassette.py
+
+Purpose:
+  Record/replay transport for the scripts' Plex HTTP session, so performance
+  problems seen against a real server can be reproduced, profiled and
+  benchmarked offline.
+
+  PLEX_CASSETTE_MODE=record
+      Every request goes to Plex as usual; the response (status, headers,
+      body) and its latency are appended to cassettes/<script>.jsonl.
+  PLEX_CASSETTE_MODE=replay
+      No network. Responses are served from the cassette, matched on
+      method + path + query + body + paging headers (X-Plex-Container-Start/
+      Size, which plexapi sends as headers rather than query parameters).
+      Repeated identical requests are replayed in recorded order (the last
+      one repeats once exhausted).
+  PLEX_CASSETTE_LATENCY=<factor>
+      In replay, sleep for the recorded latency times <factor> before each
+      response (1 = original latency profile, 0 = as fast as possible; default 0).
+  PLEX_CASSETTE_DIR
+      Where cassettes live (default: <project>/cassettes).
+
+  The X-Plex-Token query parameter is stripped before anything is written and
+  request headers are never stored. Response bodies are stored verbatim, so
+  treat cassettes like logs.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import defaultdict, deque
+from datetime import timedelta
+from typing import Deque, Dict, Optional
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DIR = os.path.join(ROOT, 'cassettes')
+
+# Headers that no longer describe the stored (already decoded) body
+_DROP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+# Request headers that select different data and so belong in the match key
+KEY_HEADERS = ('X-Plex-Container-Start', 'X-Plex-Container-Size')
+
+
+def request_key(method: str, url: str, body, headers=None) -> str:
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() != 'x-plex-token')
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1(body).hexdigest()[:12] if body else '-'
+    key = f"{method.upper()} {parts.path}?{urlencode(query)} {digest}"
+    paging = [(h, str(headers[h])) for h in KEY_HEADERS if headers and headers.get(h) is not None]
+    if paging:
+        key += ' ' + urlencode(paging)
+    return key
+
+
+class CassetteAdapter(HTTPAdapter):
+    def __init__(self, path: str, mode: str, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._tapes: Dict[str, Deque[dict]] = defaultdict(deque)
+        if mode == 'record':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w', encoding='utf-8').close()
+        else:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found: {self.path} (record one with PLEX_CASSETTE_MODE=record)")
+        with open(self.path, encoding='utf-8') as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    self._tapes[entry['key']].append(entry)
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body, request.headers)
+        if self.mode == 'record':
+            started = time.perf_counter()
+            resp = super().send(request, **kwargs)
+            content = resp.content  # reads and decodes the body
+            entry = {
+                'key': key,
+                'status': resp.status_code,
+                'reason': resp.reason,
+                'headers': {k: v for k, v in resp.headers.items() if k.lower() not in _DROP_HEADERS},
+                'body': base64.b64encode(content).decode('ascii'),
+                'elapsed': time.perf_counter() - started,
+            }
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as fh:
+                    fh.write(json.dumps(entry) + '\n')
+            return resp
+
+        with self._lock:
+            tape = self._tapes.get(key)
+            if not tape:
+                raise requests.ConnectionError(f"No cassette entry for {key} in {self.path}")
+            entry = tape.popleft() if len(tape) > 1 else tape[0]
+        if self.latency > 0:
+            time.sleep(entry['elapsed'] * self.latency)
+        return self._build_response(request, entry)
+
+    @staticmethod
+    def _build_response(request, entry: dict) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = int(entry['status'])
+        resp.reason = entry.get('reason') or ''
+        resp.headers = CaseInsensitiveDict(entry.get('headers') or {})
+        resp._content = base64.b64decode(entry['body'])
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        resp.url = request.url
+        resp.request = request
+        resp.elapsed = timedelta(seconds=float(entry.get('elapsed') or 0))
+        return resp
+
+
+def install(session: requests.Session, name: str) -> Optional[CassetteAdapter]:
+    """Mount a cassette adapter on session if PLEX_CASSETTE_MODE asks for one."""
+    mode = os.getenv('PLEX_CASSETTE_MODE', '').strip().lower()
+    if mode not in ('record', 'replay'):
+        return None
+    directory = os.getenv('PLEX_CASSETTE_DIR', '').strip() or DEFAULT_DIR
+    latency = float(os.getenv('PLEX_CASSETTE_LATENCY', '0') or 0)
+    path = os.path.join(directory, f"{name}.jsonl")
+    adapter = CassetteAdapter(path, mode, latency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    print(f"[INFO] Plex cassette {mode}: {path}", file=sys.stderr)
+    return adapter
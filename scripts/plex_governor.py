@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+plex_governor.py
+
+Purpose:
+  Request governor in front of every Plex HTTP call made through
+  plex_session.make_session(), so bursts from the pipeline scripts do not
+  crowd out users streaming from the same server:
+
+  - Token bucket: at most PLEX_RATE_LIMIT requests/second on average, with
+    bursts of up to PLEX_RATE_BURST.
+  - Adaptive concurrency (AIMD): requests in flight are capped by a limit
+    between PLEX_CONCURRENCY_MIN and PLEX_CONCURRENCY_MAX. A response slower
+    than PLEX_LATENCY_TARGET seconds, a timeout, or a 429/503 answer cuts the
+    limit by 30% (at most once per target interval); faster responses grow it
+    by 1/limit.
+  - Circuit breaker: when at least half (PLEX_BREAKER_ERROR_RATE) of the last
+    PLEX_BREAKER_WINDOW requests failed (connection errors, timeouts, 429, 5xx),
+    new requests wait PLEX_BREAKER_COOLDOWN seconds, then a single probe is let
+    through. A failed probe doubles the cooldown (up to 8x); a request that has
+    waited PLEX_BREAKER_MAX_WAIT seconds in total fails with ConnectionError.
+
+  Not installed when PLEX_CASSETTE_MODE=replay (see plex_session.py).
+  PLEX_GOVERNOR=false disables all of it; PLEX_RATE_LIMIT=0,
+  PLEX_LATENCY_TARGET=0 or PLEX_BREAKER_ERROR_RATE=0 disables that part.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import deque
+from typing import Callable, Deque, Optional
+
+import requests
+from requests.adapters import BaseAdapter
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Answers that mean "too much load" rather than "broken"
+CONGESTION_STATUS = {429, 503}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, '') or default)
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ConcurrencyLimit:
+    def __init__(self, minimum: int, maximum: int, target: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.target = target
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self.last_cut = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: Optional[float], congested: bool = False) -> None:
+        """
+        Free a slot. `latency` is None when no response arrived; `congested`
+        marks timeouts and overload answers, which cut the limit like a slow response.
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if (latency is not None or congested) and self.target > 0:
+                now = time.monotonic()
+                if congested or latency > self.target:
+                    if now - self.last_cut >= self.target:
+                        self.limit = max(self.minimum, self.limit * 0.7)
+                        self.last_cut = now
+                else:
+                    self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+
+class CircuitBreaker:
+    def __init__(self, error_rate: float, window: int, cooldown: float, max_wait: float):
+        self.error_rate = error_rate
+        self.window = max(1, window)
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.outcomes: Deque[bool] = deque(maxlen=self.window)
+        self.open_until = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before(self) -> bool:
+        """Wait while the circuit is open. Returns True if this call is the half-open probe."""
+        if self.error_rate <= 0:
+            return False
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.open_until == 0.0:
+                    return False
+                if now >= self.open_until and not self.probing:
+                    self.probing = True
+                    return True
+                delay = max(0.05, min(1.0, self.open_until - now))
+            if waited >= self.max_wait:
+                raise requests.ConnectionError(
+                    f"Plex circuit breaker open for more than {self.max_wait:.0f}s; giving up")
+            time.sleep(delay)
+            waited += delay
+
+    def after(self, ok: bool, probe: bool) -> None:
+        if self.error_rate <= 0:
+            return
+        with self.lock:
+            if probe:
+                self.probing = False
+                if ok:
+                    self.open_until = 0.0
+                    self.cooldown = self.base_cooldown
+                    self.outcomes.clear()
+                    print("[INFO] Plex circuit breaker closed; resuming requests.", file=sys.stderr)
+                else:
+                    self.cooldown = min(self.base_cooldown * 8, self.cooldown * 2)
+                    self.open_until = time.monotonic() + self.cooldown
+                    print(f"[WARN] Plex still failing; pausing requests for {self.cooldown:g}s.", file=sys.stderr)
+                return
+            self.outcomes.append(ok)
+            if self.open_until or len(self.outcomes) < self.window:
+                return
+            failures = self.outcomes.count(False)
+            if failures / len(self.outcomes) >= self.error_rate:
+                self.open_until = time.monotonic() + self.cooldown
+                print(f"[WARN] {failures}/{len(self.outcomes)} recent Plex requests failed; "
+                      f"pausing requests for {self.cooldown:g}s.", file=sys.stderr)
+
+
+class Governor:
+    """Shared limits for one process; wraps calls with bucket -> breaker -> concurrency."""
+
+    def __init__(self, bucket: TokenBucket, limit: ConcurrencyLimit, breaker: CircuitBreaker):
+        self.bucket = bucket
+        self.limit = limit
+        self.breaker = breaker
+
+    @classmethod
+    def from_env(cls) -> Optional['Governor']:
+        if os.getenv('PLEX_GOVERNOR', 'true').strip().lower() in ('0', 'false', 'no'):
+            return None
+        return cls(
+            TokenBucket(_env_float('PLEX_RATE_LIMIT', 20), _env_float('PLEX_RATE_BURST', 40)),
+            ConcurrencyLimit(int(_env_float('PLEX_CONCURRENCY_MIN', 1)), int(_env_float('PLEX_CONCURRENCY_MAX', 4)),
+                             _env_float('PLEX_LATENCY_TARGET', 5.0)),
+            CircuitBreaker(_env_float('PLEX_BREAKER_ERROR_RATE', 0.5), int(_env_float('PLEX_BREAKER_WINDOW', 20)),
+                           _env_float('PLEX_BREAKER_COOLDOWN', 15), _env_float('PLEX_BREAKER_MAX_WAIT', 300)),
+        )
+
+    def call(self, send: Callable[[], requests.Response]) -> requests.Response:
+        self.bucket.acquire()
+        probe = self.breaker.before()
+        self.limit.acquire()
+        started = time.monotonic()
+        latency = None
+        ok = False
+        congested = False
+        try:
+            resp = send()
+            latency = time.monotonic() - started
+            ok = resp.status_code not in RETRYABLE_STATUS
+            congested = resp.status_code in CONGESTION_STATUS
+            return resp
+        except (requests.Timeout, TimeoutError):
+            congested = True
+            raise
+        finally:
+            self.limit.release(latency, congested)
+            self.breaker.after(ok, probe)
+
+
+class GovernedAdapter(BaseAdapter):
+    """Transport adapter that routes every send through a Governor."""
+
+    def __init__(self, inner: BaseAdapter, governor: Governor):
+        super().__init__()
+        self.inner = inner
+        self.governor = governor
+
+    def send(self, request, stream=False, **kwargs):
+        def send_and_read():
+            resp = self.inner.send(request, stream=stream, **kwargs)
+            if not stream:
+                resp.content  # body download counts toward latency and the concurrency slot
+            return resp
+        return self.governor.call(send_and_read)
+
+    def close(self):
+        self.inner.close()
+
+
+def install(session: requests.Session) -> Optional[Governor]:
+    """Wrap the session's mounted http/https adapters with one shared Governor."""
+    governor = Governor.from_env()
+    if governor is None:
+        return None
+    for prefix in ('https://', 'http://'):
+        session.mount(prefix, GovernedAdapter(session.adapters[prefix], governor))
+    return governor
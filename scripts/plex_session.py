@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+plex_session.py
+
+Purpose:
+  Builds the requests.Session the scripts hand to PlexServer, so transport
+  concerns (SSL verification, cassette record/replay, request governor) are
+  configured in one place. The governor is left out in cassette replay: no
+  request reaches Plex, and replay timing should depend only on
+  PLEX_CASSETTE_LATENCY.
+"""
+
+import requests
+
+import plex_cassette
+import plex_governor
+
+
+def make_session(verify: bool, name: str) -> requests.Session:
+    """
+    Session for PlexServer(..., session=...). `name` identifies the calling
+    script (e.g. 'getEpisodes') and names its cassette file.
+    """
+    session = requests.Session()
+    session.verify = True if verify else False
+    cassette = plex_cassette.install(session, name)
+    if cassette is None or cassette.mode != 'replay':
+        plex_governor.install(session)
+    return session
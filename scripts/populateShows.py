@@ -3,12 +3,18 @@
 populateShows.py
 
 Usage:
-  python populateShows.py
+  python populateShows.py [--full] [--profile]
 
 Purpose:
-  Creates/initializes the SQLite DB and populates table `allShows` with every
+  Creates/initializes the SQLite DB and syncs table `allShows` with every
   TV show in your Plex libraries (stores ratingKey, title, total_episodes).
 
+  The sync is incremental: sections whose change marker (contentChangedAt /
+  updatedAt) matches the last sync are skipped without listing their shows,
+  only new or changed rows are written, and shows that left Plex are deleted
+  (also from playlistShows). Everything happens in one transaction; --full
+  ignores the section markers.
+
 Environment:
   - .env in project root with:
       PLEX_URL
@@ -22,12 +28,22 @@ Exit codes:
 import os
 import sys
 import sqlite3
+import argparse
 from pathlib import Path
 
-import requests
 from dotenv import load_dotenv
 from plexapi.server import PlexServer
 
+import profiling
+from plex_session import make_session
+from db_migrate import migrate
+
+profiling.enable_from_cli('populateShows')
+
+parser = argparse.ArgumentParser(description="Sync the Plex TV show catalog into allShows.")
+parser.add_argument("--full", action="store_true", help="Re-read every section even if Plex reports no changes")
+args = parser.parse_args()
+
 # ----- Paths & env (.env sits next to web root) -----
 APP_ROOT = Path(__file__).resolve().parents[1]               # /var/www/html
 ENV_PATH = APP_ROOT / ".env"
@@ -82,37 +98,9 @@ def remap_localhost_for_container(url: str) -> str:
 # >>> FIX: remap the actual PLEX_URL variable <<<
 PLEX_URL = remap_localhost_for_container(PLEX_URL)
 
-# ----- Init database -----
-create_tables_sql = """
-CREATE TABLE IF NOT EXISTS allShows (
-    id INTEGER PRIMARY KEY,
-    title TEXT NOT NULL,
-    total_episodes INTEGER DEFAULT 0
-);
-CREATE TABLE IF NOT EXISTS playlistShows (
-    id INTEGER PRIMARY KEY,
-    title TEXT NOT NULL,
-    total_episodes INTEGER DEFAULT 0,
-    timeSlot INTEGER
-);
-CREATE TABLE IF NOT EXISTS playlistEpisodes (
-    ratingKey INTEGER PRIMARY KEY,
-    season INTEGER,
-    episode INTEGER,
-    releaseDate TEXT,
-    duration INTEGER,
-    summary TEXT,
-    watchedStatus BOOLEAN,
-    title TEXT,
-    episodeTitle TEXT,
-    show_id INTEGER,
-    timeSlot INTEGER
-);
-"""
-
+# ----- Init database (same schema/migrations as db_migrate.py) -----
 with sqlite3.connect(DB_PATH) as conn:
-    conn.executescript(create_tables_sql)
-    conn.commit()
+    migrate(conn)
 
 # Make DB file group-writable and owned by www-data if possible
 try:
@@ -124,34 +112,131 @@ except Exception:
 
 # ----- Plex connection (respect PLEX_VERIFY_SSL) -----
 try:
-    session = requests.Session()
-    session.verify = True if PLEX_VERIFY_SSL else False
+    session = make_session(PLEX_VERIFY_SSL, 'populateShows')
     plex = PlexServer(PLEX_URL, PLEX_TOKEN, session=session)
     print("Connected to Plex Server.")
 except Exception as e:
     print(f"[ERROR] Plex connect failed: {e}", file=sys.stderr)
     sys.exit(1)
 
-# ----- Populate shows -----
+profiling.phase('init db + connect')
+
+# ----- Incremental catalog sync -----
+def section_marker(section) -> str:
+    """Change marker for a library section (contentChangedAt moves on any content change)."""
+    attrib = getattr(getattr(section, '_data', None), 'attrib', {}) or {}
+    return ":".join(str(attrib.get(k, '')) for k in ('contentChangedAt', 'updatedAt', 'scannedAt'))
+
+def show_row(show, section_id: int):
+    total = getattr(show, "leafCount", None)
+    if total is None:
+        total = len(show.episodes())
+    updated = getattr(show, "updatedAt", None)
+    return (show.title, int(total or 0), section_id, int(updated.timestamp()) if updated else None)
+
 try:
-    shows = plex.library.search(libtype="show")
+    sections = [s for s in plex.library.sections() if getattr(s, 'type', '') == 'show']
 except Exception as e:
     print(f"[ERROR] Plex library query failed: {e}", file=sys.stderr)
     sys.exit(1)
 
-with sqlite3.connect(DB_PATH) as conn:
-    cur = conn.cursor()
-    for show in shows:
-        try:
-            total = getattr(show, "leafCount", None)
-            if total is None:
-                total = len(show.episodes())
-            cur.execute(
-                "INSERT OR REPLACE INTO allShows (id, title, total_episodes) VALUES (?, ?, ?)",
-                (int(show.ratingKey), show.title, int(total or 0)),
-            )
-        except Exception as e:
-            print(f"[WARN] Skip {getattr(show, 'title', '<unknown>')}: {e}", file=sys.stderr)
-    conn.commit()
+counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'skipped': 0, 'sections_skipped': 0}
 
+conn = sqlite3.connect(DB_PATH)
+try:
+    with conn:  # one transaction: commit on success, roll back on any error
+        existing = {
+            int(r[0]): (r[1], r[2], r[3], r[4])
+            for r in conn.execute("SELECT id, title, total_episodes, section_id, updated_at FROM allShows")
+        }
+        markers = {
+            k: v for k, v in conn.execute("SELECT key, value FROM settings WHERE key LIKE 'section_marker:%'")
+        }
+        seen_sections = set()
+
+        for section in sections:
+            section_id = int(section.key)
+            seen_sections.add(section_id)
+            marker_key = f"section_marker:{section_id}"
+            marker = section_marker(section)
+            if not args.full and marker and markers.get(marker_key) == marker:
+                unchanged = sum(1 for row in existing.values() if row[2] == section_id)
+                counts['sections_skipped'] += 1
+                counts['skipped'] += unchanged
+                print(f"[INFO] {section.title}: unchanged since last sync ({unchanged} shows)")
+                continue
+
+            present = set()
+            failed = 0
+            for show in section.all():
+                try:
+                    rk = int(show.ratingKey)
+                except Exception as e:
+                    print(f"[WARN] Skip {getattr(show, 'title', '<unknown>')}: {e}", file=sys.stderr)
+                    failed += 1
+                    continue
+                # Still in the library even if its row can't be built right now:
+                # keep the existing row (and the user's selection) as it is
+                present.add(rk)
+                try:
+                    row = show_row(show, section_id)
+                except Exception as e:
+                    print(f"[WARN] Skip {getattr(show, 'title', '<unknown>')}: {e}", file=sys.stderr)
+                    failed += 1
+                    continue
+                if rk not in existing:
+                    conn.execute(
+                        "INSERT INTO allShows (id, title, total_episodes, section_id, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (rk, *row),
+                    )
+                    counts['inserted'] += 1
+                elif existing[rk] != row:
+                    conn.execute(
+                        "UPDATE allShows SET title = ?, total_episodes = ?, section_id = ?, updated_at = ? WHERE id = ?",
+                        (*row, rk),
+                    )
+                    counts['updated'] += 1
+                else:
+                    counts['skipped'] += 1
+                existing[rk] = row
+
+            gone = [rk for rk, row in existing.items() if row[2] == section_id and rk not in present]
+            for rk in gone:
+                del existing[rk]
+            if gone:
+                conn.executemany("DELETE FROM allShows WHERE id = ?", [(rk,) for rk in gone])
+                conn.executemany("DELETE FROM playlistShows WHERE id = ?", [(rk,) for rk in gone])
+                counts['deleted'] += len(gone)
+
+            # A section with failed shows is re-read next time instead of being skipped as unchanged
+            if failed:
+                conn.execute("DELETE FROM settings WHERE key = ?", (marker_key,))
+            else:
+                conn.execute(
+                    "INSERT INTO settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                    (marker_key, marker),
+                )
+            print(f"[INFO] {section.title}: synced {len(present)} shows"
+                  + (f" ({failed} could not be read)" if failed else ""))
+
+        # Shows whose library section disappeared (or legacy rows never tied to one)
+        orphans = [rk for rk, row in existing.items() if row[2] not in seen_sections]
+        if orphans:
+            conn.executemany("DELETE FROM allShows WHERE id = ?", [(rk,) for rk in orphans])
+            conn.executemany("DELETE FROM playlistShows WHERE id = ?", [(rk,) for rk in orphans])
+            counts['deleted'] += len(orphans)
+        for section_id in {int(k.split(':', 1)[1]) for k in markers} - seen_sections:
+            conn.execute("DELETE FROM settings WHERE key = ?", (f"section_marker:{section_id}",))
+except Exception as e:
+    print(f"[ERROR] Catalog sync failed (no changes written): {e}", file=sys.stderr)
+    sys.exit(1)
+finally:
+    conn.close()
+
+print(
+    f"[INFO] Catalog sync: {counts['inserted']} inserted, {counts['updated']} updated, "
+    f"{counts['deleted']} deleted, {counts['skipped']} unchanged "
+    f"({counts['sections_skipped']} of {len(sections)} sections skipped)."
+)
+profiling.phase('write allShows')
 print(f"[SUCCESS] Database update complete. Wrote {DB_PATH}")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+profiling.py
+
+Purpose:
+  Opt-in profiling for the pipeline scripts. Enabled with `--profile` on the
+  command line or PLEX_PROFILE=1 in .env (or the process environment).
+  enable_from_cli() runs before the scripts load .env, so PLEX_PROFILE* settings
+  are read from the .env file directly, with .env winning over the environment
+  just as the scripts' own load_dotenv(override=True) does. That way runs
+  started from the web UI are profiled too.
+
+  When enabled, on exit the script writes to logs/:
+    <script>_<timestamp>.pstats        cProfile stats (open with `python -m pstats`)
+    <script>_<timestamp>.profile.txt   top functions by cumulative time, top-N
+                                       allocations per phase (tracemalloc) and
+                                       peak RSS
+
+Usage (inside a script, before any heavy work):
+  import profiling
+  profiling.enable_from_cli('getEpisodes')
+  ...
+  profiling.phase('fetch shows')   # marks a phase boundary (no-op when disabled)
+"""
+
+import io
+import os
+import sys
+import time
+import atexit
+import pstats
+import cProfile
+import resource
+import tracemalloc
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from dotenv import dotenv_values
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LOG_DIR = os.path.join(ROOT, 'logs')
+ENV_PATH = os.path.join(ROOT, '.env')
+
+_profiler: Optional[cProfile.Profile] = None
+_script: str = ''
+_phases: List[Tuple[str, float, tracemalloc.Snapshot]] = []
+
+
+def _setting(name: str, default: str) -> str:
+    """PLEX_PROFILE* value from .env, else the environment, else default."""
+    try:
+        value = dotenv_values(ENV_PATH).get(name) if os.path.exists(ENV_PATH) else None
+    except OSError:
+        value = None
+    if value is None:
+        value = os.getenv(name)
+    return (value or default).strip()
+
+
+def _int_setting(name: str, default: int) -> int:
+    try:
+        return int(_setting(name, str(default)))
+    except ValueError:
+        return default
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def enable_from_cli(script: str) -> bool:
+    """
+    Strip `--profile` from sys.argv (so argparse never sees it) and start
+    profiling if it was present or PLEX_PROFILE is truthy.
+    """
+    flag = '--profile' in sys.argv[1:]
+    if flag:
+        sys.argv = [sys.argv[0]] + [a for a in sys.argv[1:] if a != '--profile']
+    env = _setting('PLEX_PROFILE', '').lower() in ('1', 'true', 'yes')
+    if not (flag or env):
+        return False
+    start(script)
+    return True
+
+
+def start(script: str) -> None:
+    global _profiler, _script
+    if _profiler is not None:
+        return
+    _script = script
+    tracemalloc.start(max(1, _int_setting('PLEX_PROFILE_FRAMES', 1)))
+    _profiler = cProfile.Profile()
+    _phases.append(('start', time.perf_counter(), _snapshot()))
+    atexit.register(_finish)
+    _profiler.enable()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # Hide the profiler's own bookkeeping from the allocation report
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+
+def phase(name: str) -> None:
+    """Record a phase boundary: wall time + tracemalloc snapshot."""
+    if _profiler is None:
+        return
+    _profiler.disable()
+    _phases.append((name, time.perf_counter(), _snapshot()))
+    _profiler.enable()
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _finish() -> None:
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.disable()
+    _phases.append(('exit', time.perf_counter(), _snapshot()))
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    top_n = _int_setting('PLEX_PROFILE_TOP', 25)
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(LOG_DIR, f"{_script}_{stamp}")
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        _profiler.dump_stats(base + '.pstats')
+
+        out = io.StringIO()
+        out.write(f"=== PROFILE: {_script} ===\n")
+        out.write(f"Peak RSS: {_peak_rss_mb():.1f} MiB\n")
+        out.write(f"Peak traced (tracemalloc): {traced_peak / (1024 * 1024):.1f} MiB\n\n")
+
+        out.write("=== PHASES ===\n")
+        for (prev_name, prev_t, prev_snap), (name, t, snap) in zip(_phases, _phases[1:]):
+            size = sum(s.size for s in snap.statistics('filename'))
+            out.write(f"\n--- {prev_name} -> {name}: {t - prev_t:.3f}s, traced now {size / (1024 * 1024):.1f} MiB ---\n")
+            for stat in snap.compare_to(prev_snap, 'lineno')[:top_n]:
+                out.write(f"  {stat}\n")
+
+        out.write(f"\n=== TOP {top_n} BY CUMULATIVE TIME ===\n")
+        stats = pstats.Stats(_profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(top_n)
+
+        with open(base + '.profile.txt', 'w', encoding='utf-8') as fh:
+            fh.write(out.getvalue())
+        print(f"[INFO] Profile written to {base}.pstats / {base}.profile.txt", file=sys.stderr)
+    except Exception as e:
+        print(f"[WARN] Could not write profile for {_script}: {e}", file=sys.stderr)
+    finally:
+        _profiler = None
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+refreshWatched.py
+
+Usage:
+  python refreshWatched.py [--page-size 2000] [--profile]
+
+Purpose:
+  Refreshes playlistEpisodes.watchedStatus for the selected shows without
+  re-ingesting episodes. For each TV library that holds a selected show it
+  pages through the section-wide unwatched-episode filter
+    /library/sections/<key>/all?type=4&unwatched=1
+  with Plex's heavy fields and child elements excluded, reading only
+  ratingKey and grandparentRatingKey from each row. Episodes of selected shows
+  that are in that list become unwatched, every other episode of those shows
+  becomes watched. Only rows whose flag actually changes are written, in one
+  transaction together with the showAggregates/slotAggregates refresh.
+
+  Nothing is written if any library query fails, so a partial listing never
+  marks episodes as watched.
+
+Environment:
+  - .env in project root with:
+      PLEX_URL
+      PLEX_TOKEN
+      PLEX_VERIFY_SSL (optional; default "false")
+
+Exit codes:
+  1 -> SQLite error
+  2 -> .env missing or PLEX_* missing
+  3 -> Plex connection failed
+  4 -> Plex library query failed
+  0 -> Success
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+from typing import Dict, Iterator, Set, Tuple
+from urllib.parse import urlparse, urlunparse
+
+from dotenv import load_dotenv
+from plexapi.server import PlexServer
+
+import profiling
+from plex_session import make_session
+import episode_aggregates
+from db_migrate import migrate
+from pipeline_lock import hold_for_script
+
+profiling.enable_from_cli('refreshWatched')
+
+parser = argparse.ArgumentParser(description="Refresh watchedStatus for the selected shows from Plex.")
+parser.add_argument("--page-size", type=int, default=2000, help="Episodes per library page request")
+args = parser.parse_args()
+
+# ---------------------------
+# Paths & .env loading
+# ---------------------------
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ENV_PATH = os.path.join(ROOT, '.env')
+DB_FILE = os.path.join(ROOT, 'database', 'plex_playlist.db')
+
+if not os.path.exists(ENV_PATH):
+    print(f"[ERROR] .env not found at {ENV_PATH}", file=sys.stderr)
+    sys.exit(2)
+
+load_dotenv(ENV_PATH, override=True)
+
+PLEX_URL = os.getenv('PLEX_URL', '').strip()
+PLEX_TOKEN = os.getenv('PLEX_TOKEN', '').strip()
+PLEX_VERIFY_SSL = os.getenv('PLEX_VERIFY_SSL', 'false').strip().lower() in ('1', 'true', 'yes')
+
+if not PLEX_URL or not PLEX_TOKEN:
+    print("[ERROR] Missing PLEX_URL or PLEX_TOKEN in .env", file=sys.stderr)
+    sys.exit(2)
+
+def remap_localhost_for_container(url: str) -> str:
+    """Map localhost/127.0.0.1 to host.docker.internal for container -> host access."""
+    try:
+        u = urlparse(url or '')
+        host = (u.hostname or '').lower()
+        if host in ('localhost', '127.0.0.1'):
+            scheme = (u.scheme or 'http')
+            port = u.port or (443 if scheme == 'https' else 32400)
+            netloc = f"host.docker.internal:{port}"
+            return urlunparse((scheme, netloc, u.path or '', u.params or '', u.query or '', u.fragment or ''))
+    except Exception:
+        pass
+    return url
+
+PLEX_URL = remap_localhost_for_container(PLEX_URL)
+
+# Trim the listing to what we read; servers that do not know these ignore them
+LEAN_PARAMS = {
+    'type': 4,            # episodes
+    'unwatched': 1,
+    'excludeFields': 'summary,thumb,art,parentThumb,grandparentThumb,grandparentArt,'
+                     'grandparentTheme,title,titleSort,originallyAvailableAt,contentRating',
+    'excludeElements': 'Media,Genre,Role,Director,Writer,Guid,Image,UltraBlurColors,Rating,Marker',
+}
+
+# Serialize with any other pipeline run (no-op under runPipeline.py)
+hold_for_script()
+
+# ---------------------------
+# Connect to Plex
+# ---------------------------
+try:
+    session = make_session(PLEX_VERIFY_SSL, 'refreshWatched')
+    plex = PlexServer(PLEX_URL, PLEX_TOKEN, session=session)
+    print("[INFO] Connected to Plex Server.")
+except Exception as e:
+    print(f"[ERROR] Plex connect failed: {e}", file=sys.stderr)
+    sys.exit(3)
+
+# ---------------------------
+# Selected shows and the libraries that hold them
+# ---------------------------
+try:
+    db_conn = sqlite3.connect(DB_FILE)
+    migrate(db_conn)  # once per run; refresh_shows() below holds no DDL
+    selected: Dict[int, object] = {
+        int(show_id): section_id for show_id, section_id in db_conn.execute(
+            "SELECT p.id, a.section_id FROM playlistShows p LEFT JOIN allShows a ON a.id = p.id")
+    }
+except sqlite3.Error as e:
+    print(f"[ERROR] SQLite error: {e}", file=sys.stderr)
+    sys.exit(1)
+
+if not selected:
+    print("[INFO] No shows selected; nothing to refresh.")
+    db_conn.close()
+    sys.exit(0)
+
+try:
+    sections = [s for s in plex.library.sections() if getattr(s, 'type', '') == 'show']
+except Exception as e:
+    print(f"[ERROR] Plex library query failed: {e}", file=sys.stderr)
+    sys.exit(4)
+
+# Only libraries known to hold a selected show (all TV libraries if any show's library is unknown)
+known = {int(s) for s in selected.values() if s is not None}
+if None not in selected.values():
+    sections = [s for s in sections if int(s.key) in known]
+
+profiling.phase('connect + selection')
+
+
+def unwatched_rows(section_key: int, page_size: int) -> Iterator[Tuple[int, int]]:
+    """Yield (ratingKey, grandparentRatingKey) of unwatched episodes, page by page."""
+    start = 0
+    while True:
+        params = dict(LEAN_PARAMS, **{'X-Plex-Container-Start': start, 'X-Plex-Container-Size': page_size})
+        root = plex.query(f"/library/sections/{section_key}/all", params=params)
+        rows = 0
+        for el in (root if root is not None else []):
+            rows += 1
+            rk = el.attrib.get('ratingKey')
+            show = el.attrib.get('grandparentRatingKey')
+            if rk and show:
+                yield int(rk), int(show)
+        start += rows
+        total = int(root.attrib.get('totalSize', 0) or 0) if root is not None else 0
+        if rows < page_size or (total and start >= total):
+            return
+
+
+# ---------------------------
+# Collect unwatched ratingKeys of selected shows
+# ---------------------------
+unwatched: Set[int] = set()
+try:
+    for section in sections:
+        before = len(unwatched)
+        for rk, show in unwatched_rows(int(section.key), max(1, args.page_size)):
+            if show in selected:
+                unwatched.add(rk)
+        print(f"[INFO] {section.title}: {len(unwatched) - before} unwatched episodes in selected shows.")
+except Exception as e:
+    print(f"[ERROR] Plex library query failed: {e}", file=sys.stderr)
+    db_conn.close()
+    sys.exit(4)
+
+profiling.phase('list unwatched')
+
+# ---------------------------
+# Write only changed flags, in one transaction
+# ---------------------------
+NEW_FLAG = "(ratingKey NOT IN (SELECT ratingKey FROM temp.unwatchedNow))"
+try:
+    with db_conn:
+        db_conn.execute("CREATE TEMP TABLE IF NOT EXISTS unwatchedNow (ratingKey INTEGER PRIMARY KEY)")
+        db_conn.execute("DELETE FROM temp.unwatchedNow")
+        db_conn.executemany("INSERT INTO temp.unwatchedNow (ratingKey) VALUES (?)", ((k,) for k in unwatched))
+        scope = "show_id IN (SELECT id FROM playlistShows)"
+        changed_shows = [r[0] for r in db_conn.execute(
+            f"SELECT DISTINCT show_id FROM playlistEpisodes WHERE {scope} AND watchedStatus IS NOT {NEW_FLAG}")]
+        cur = db_conn.execute(
+            f"UPDATE playlistEpisodes SET watchedStatus = {NEW_FLAG} WHERE {scope} AND watchedStatus IS NOT {NEW_FLAG}")
+        changed = cur.rowcount
+        episode_aggregates.refresh_shows(db_conn, changed_shows)
+except sqlite3.Error as e:
+    print(f"[ERROR] Could not update watchedStatus: {e}", file=sys.stderr)
+    db_conn.close()
+    sys.exit(1)
+
+profiling.phase('update flags')
+print(f"[SUCCESS] watchedStatus refreshed: {changed} episodes changed across {len(changed_shows)} shows "
+      f"({len(unwatched)} unwatched).")
+db_conn.close()
+sys.exit(0)
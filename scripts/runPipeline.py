@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+runPipeline.py
+
+Usage:
+  python runPipeline.py
+
+Purpose:
+  Run coordinator for the playlist pipeline (getEpisodes.py -> newPlaylist.py
+  --fill, which creates and fills the playlist in one pass; generatePlaylist.py
+  only runs if newPlaylist.py fell back to an empty seed playlist). Guarantees
+  that only one run touches Plex / the DB at a time and that no Plex work is
+  ever duplicated:
+
+  - A request whose inputs (selected shows + timeslots) match the in-flight run
+    is coalesced onto it and returns that run's result.
+  - A request for different inputs is queued behind the in-flight run. Every
+    further request arriving meanwhile joins that single queued run, which
+    reads the newest inputs when it starts.
+  - A queued run whose inputs turn out identical to a run that finished after
+    it was queued reuses that result instead of calling Plex again.
+
+  Runs are tracked in SQLite table `pipelineRuns`; the exclusive section is
+  guarded by pipeline_lock.py. Prints JSON:
+    {"ok": true, "run_id": 7, "coalesced": false, "ratingKey": 12345, "title": "...", "logs": {...}}
+
+Environment:
+  - .env in project root (optional here; each step loads it too):
+      PIPELINE_WAIT_TIMEOUT  seconds a coalesced/queued request waits (default 3600)
+
+Exit codes:
+  1 -> SQLite error
+  8 -> A pipeline step failed (see "step", "exit_code", "log" in the JSON)
+  9 -> Timed out waiting for another run
+  0 -> Success
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import subprocess
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import pipeline_lock
+from db_migrate import migrate
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCRIPTS_DIR = os.path.join(ROOT, 'scripts')
+DB_PATH = os.path.join(ROOT, 'database', 'plex_playlist.db')
+LOG_DIR = os.path.join(ROOT, 'logs')
+ENV_PATH = os.path.join(ROOT, '.env')
+
+POLL_INTERVAL = 0.5
+
+def jout(payload: Dict, code: int) -> None:
+    print(json.dumps(payload))
+    sys.exit(code)
+
+
+def wait_timeout() -> float:
+    try:
+        return float(os.getenv('PIPELINE_WAIT_TIMEOUT', '') or 3600)
+    except ValueError:
+        return 3600.0
+
+
+def pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def reap_abandoned(conn: sqlite3.Connection) -> None:
+    """Fail queued/running rows whose owning process has died."""
+    rows = conn.execute(
+        "SELECT id, pid FROM pipelineRuns WHERE status IN ('queued', 'running')"
+    ).fetchall()
+    for run_id, pid in rows:
+        if not pid_alive(pid):
+            conn.execute(
+                "UPDATE pipelineRuns SET status = 'failed', finished_at = ?, result = ? WHERE id = ?",
+                (time.time(), json.dumps({"ok": False, "error": "Run abandoned (owner process exited)."}), run_id),
+            )
+
+
+def claim(conn: sqlite3.Connection, fingerprint: str) -> Tuple[int, bool]:
+    """
+    Decide what this request does. Returns (run_id, owner):
+    owner=True means we must execute run_id; False means wait for it.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        reap_abandoned(conn)
+        running = conn.execute(
+            "SELECT id, fingerprint FROM pipelineRuns WHERE status = 'running' ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        queued = conn.execute(
+            "SELECT id FROM pipelineRuns WHERE status = 'queued' ORDER BY id LIMIT 1"
+        ).fetchone()
+
+        if running and running[1] == fingerprint:
+            decision = (int(running[0]), False)
+        elif queued:
+            decision = (int(queued[0]), False)
+        else:
+            cur = conn.execute(
+                "INSERT INTO pipelineRuns (fingerprint, status, pid, created_at) VALUES (?, 'queued', ?, ?)",
+                (fingerprint, os.getpid(), time.time()),
+            )
+            decision = (int(cur.lastrowid), True)
+        conn.execute("COMMIT")
+        return decision
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def wait_for(conn: sqlite3.Connection, run_id: int) -> Dict:
+    timeout = wait_timeout()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        row = conn.execute("SELECT status, result, pid FROM pipelineRuns WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return {"ok": False, "error": f"Run {run_id} disappeared."}
+        status, result, pid = row
+        if status in ('done', 'failed'):
+            return json.loads(result or '{}')
+        if not pid_alive(pid):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                reap_abandoned(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            continue
+        time.sleep(POLL_INTERVAL)
+    jout({"ok": False, "run_id": run_id, "error": f"Timed out after {timeout:.0f}s waiting for run {run_id}."}, 9)
+    return {}
+
+
+def run_step(script: str, args, stamp: str) -> Dict:
+    """Run one pipeline script, write a per-step log in the same format as the web UI."""
+    cmd = [sys.executable, os.path.join(SCRIPTS_DIR, script), *[str(a) for a in args]]
+    env = dict(os.environ, **{pipeline_lock.HELD_ENV: '1'})
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    log_path = os.path.join(LOG_DIR, f"{os.path.splitext(script)[0]}_{stamp}.log")
+    try:
+        with open(log_path, 'w', encoding='utf-8') as fh:
+            fh.write(f"=== CMD ===\n{' '.join(cmd)}\n\n=== EXIT ===\n{proc.returncode}\n\n"
+                     f"=== STDOUT ===\n{proc.stdout}\n\n=== STDERR ===\n{proc.stderr}\n")
+    except OSError as e:
+        print(f"[WARN] Could not write log {log_path}: {e}", file=sys.stderr)
+    return {"script": script, "exit_code": proc.returncode, "stdout": proc.stdout, "stderr": proc.stderr, "log": log_path}
+
+
+def step_failed(step: Dict) -> Dict:
+    return {
+        "ok": False,
+        "step": step["script"],
+        "exit_code": step["exit_code"],
+        "log": step["log"],
+        "stdout": step["stdout"][-4000:],
+        "stderr": step["stderr"][-4000:],
+    }
+
+
+def execute() -> Dict:
+    """The actual pipeline. Caller holds the pipeline lock."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    logs: Dict[str, str] = {}
+
+    r1 = run_step('getEpisodes.py', [], stamp)
+    logs['getEpisodes'] = r1['log']
+    if r1['exit_code'] != 0:
+        return step_failed(r1)
+
+    # Creates the playlist with a small seed batch and appends the rest
+    r2 = run_step('newPlaylist.py', ['--fill'], stamp)
+    logs['newPlaylist'] = r2['log']
+    if r2['exit_code'] != 0:
+        return step_failed(r2)
+    try:
+        created = json.loads(r2['stdout'].strip().splitlines()[-1])
+        rating_key = int(created['ratingKey']) if created.get('ok') else None
+    except Exception:
+        rating_key = None
+    if not rating_key:
+        out = step_failed(r2)
+        out["error"] = "Failed to create new playlist or retrieve its ratingKey."
+        return out
+
+    if not created.get('filled'):
+        r3 = run_step('generatePlaylist.py', [rating_key], stamp)
+        logs['generatePlaylist'] = r3['log']
+        if r3['exit_code'] != 0:
+            return step_failed(r3)
+
+    return {"ok": True, "ratingKey": rating_key, "title": created.get('title'), "logs": logs}
+
+
+def start_run(conn: sqlite3.Connection, run_id: int) -> Optional[Dict]:
+    """
+    Mark run_id as running, or finish it with the result of a run that ended
+    with the same inputs while we were queued (returned). Caller holds the lock.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        fingerprint = pipeline_lock.inputs_fingerprint(conn)
+        created_at = conn.execute("SELECT created_at FROM pipelineRuns WHERE id = ?", (run_id,)).fetchone()[0]
+        last = conn.execute(
+            "SELECT id, fingerprint, finished_at, result FROM pipelineRuns "
+            "WHERE status = 'done' ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if last and last[1] == fingerprint and (last[2] or 0) >= created_at:
+            # Inputs settled back to what a run finished while we were queued.
+            result = json.loads(last[3] or '{}')
+            result["reused_run_id"] = int(last[0])
+            conn.execute(
+                "UPDATE pipelineRuns SET status = 'done', fingerprint = ?, started_at = ?, finished_at = ?, result = ? WHERE id = ?",
+                (fingerprint, time.time(), time.time(), json.dumps(result), run_id),
+            )
+            conn.execute("COMMIT")
+            print(f"[INFO] Inputs match run {last[0]}; reusing its result.", file=sys.stderr)
+            return result
+        conn.execute(
+            "UPDATE pipelineRuns SET status = 'running', fingerprint = ?, started_at = ? WHERE id = ?",
+            (fingerprint, time.time(), run_id),
+        )
+        conn.execute("COMMIT")
+        return None
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def own_run(conn: sqlite3.Connection, run_id: int) -> Dict:
+    pipeline_lock.acquire(blocking=True)
+    try:
+        reused = start_run(conn, run_id)
+        if reused is not None:
+            return reused
+
+        try:
+            result = execute()
+        except Exception as e:
+            result = {"ok": False, "error": f"Pipeline crashed: {e}"}
+
+        conn.execute(
+            "UPDATE pipelineRuns SET status = ?, finished_at = ?, result = ? WHERE id = ?",
+            ('done' if result.get('ok') else 'failed', time.time(), json.dumps(result), run_id),
+        )
+        return result
+    finally:
+        pipeline_lock.release()
+
+
+def main() -> None:
+    # Settings such as PIPELINE_WAIT_TIMEOUT live in .env when started from the web UI
+    if os.path.exists(ENV_PATH):
+        load_dotenv(ENV_PATH, override=True)
+
+    try:
+        # Autocommit mode; transactions are explicit BEGIN IMMEDIATE blocks.
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        migrate(conn)  # pipelineRuns and its index are defined in db_migrate.py
+        fingerprint = pipeline_lock.inputs_fingerprint(conn)
+        run_id, owner = claim(conn, fingerprint)
+    except sqlite3.Error as e:
+        jout({"ok": False, "error": f"SQLite error: {e}"}, 1)
+
+    if owner:
+        print(f"[INFO] Starting pipeline run {run_id}.", file=sys.stderr)
+        try:
+            result = own_run(conn, run_id)
+        except sqlite3.Error as e:
+            jout({"ok": False, "run_id": run_id, "error": f"SQLite error: {e}"}, 1)
+    else:
+        print(f"[INFO] Coalescing onto pipeline run {run_id}.", file=sys.stderr)
+        result = wait_for(conn, run_id)
+
+    conn.close()
+    payload = dict(result, run_id=run_id, coalesced=not owner)
+    jout(payload, 0 if result.get('ok') else 8)
+
+
+if __name__ == '__main__':
+    main()
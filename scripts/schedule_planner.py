@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+schedule_planner.py
+
+Usage:
+  python schedule_planner.py [--days 90] [--hours-per-day 24] [--budget SLOT=MINUTES ...]
+                             [--default-minutes 30] [--dry-run]
+  python schedule_planner.py --bench 100000 500000
+
+Purpose:
+  Channel-style planning over playlistEpisodes.duration (minutes). Every day
+  of the horizon is a sequence of timeSlot blocks, each with an airtime
+  budget; each block plays the next show of that slot (shows within a slot
+  take turns block by block) and takes as many of its next episodes as fit
+  the budget, and always at least one, so long episodes still air.
+
+  The episodes are laid out in EpisodeStore order (timeSlot, show, season,
+  episode), so every show is a contiguous range of one prefix-sum array of
+  durations. Packing a block is then a single binary search
+  (numpy.searchsorted when NumPy is installed, bisect otherwise) and the
+  whole horizon costs O(blocks * log episodes) after one O(n) cumulative sum.
+
+  Budgets: --budget 1=120 gives slot 1 two hours a day. Slots without an
+  explicit budget share the rest of --hours-per-day equally.
+
+  The plan is written to table plannedOrder(position, ratingKey, day,
+  timeSlot, start_minute); `newPlaylist.py --fill --planned` and
+  `generatePlaylist.py <ratingKey> --planned` fill the playlist in that order.
+  Re-run the planner after changing shows or timeslots.
+
+Exit codes:
+  1 -> SQLite error
+  2 -> Invalid budget / arguments
+  3 -> No episodes to plan
+  0 -> Success
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional; the pure-Python path gives the same plan
+    np = None
+
+from episode_store import EpisodeStore, FETCH_CHUNK, synthetic_db
+from db_migrate import migrate
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DB_PATH = os.path.join(ROOT, 'database', 'plex_playlist.db')
+
+# Planned keys still present in playlistEpisodes (purged/missing ones drop out)
+PLANNED_SQL = """
+SELECT p.ratingKey
+FROM plannedOrder p
+JOIN playlistEpisodes e ON e.ratingKey = p.ratingKey
+{where}
+ORDER BY p.position
+"""
+
+
+class Plan:
+    __slots__ = ('rating_key', 'day', 'slot', 'start_minute')
+
+    def __init__(self):
+        self.rating_key = array('q')
+        self.day = array('i')
+        self.slot = array('i')
+        self.start_minute = array('i')
+
+    def __len__(self) -> int:
+        return len(self.rating_key)
+
+
+def slot_budgets(slots: Sequence[int], explicit: Dict[int, int], hours_per_day: float) -> Dict[int, int]:
+    """Minutes per day for each slot: explicit ones as given, the rest share what is left."""
+    day_minutes = int(round(hours_per_day * 60))
+    budgets = {s: explicit[s] for s in slots if s in explicit}
+    rest = [s for s in slots if s not in explicit]
+    left = day_minutes - sum(budgets.values())
+    if rest and left > 0:
+        share, extra = divmod(left, len(rest))
+        for i, s in enumerate(rest):
+            budgets[s] = share + (1 if i < extra else 0)
+    return {s: m for s, m in budgets.items() if m > 0}
+
+
+def show_ranges(store: EpisodeStore) -> Dict[int, List[Tuple[int, int]]]:
+    """{ timeSlot: [(start, end) index range of each show, in order] } for a store sorted by slot, show."""
+    ranges: Dict[int, List[Tuple[int, int]]] = {}
+    slots, shows = store.slot, store.show
+    n = len(slots)
+    if np is not None:
+        slot_v = np.frombuffer(slots, dtype=np.int32)
+        show_v = np.frombuffer(shows, dtype=np.int64)
+        cuts = (np.flatnonzero((slot_v[1:] != slot_v[:-1]) | (show_v[1:] != show_v[:-1])) + 1).tolist()
+        for start, end in zip([0] + cuts, cuts + [n]):
+            ranges.setdefault(slots[start], []).append((start, end))
+        return ranges
+    start = 0
+    for i in range(1, n + 1):
+        if i == n or slots[i] != slots[start] or shows[i] != shows[start]:
+            ranges.setdefault(slots[start], []).append((start, i))
+            start = i
+    return ranges
+
+
+def prefix_minutes(durations: array, default_minutes: int):
+    """cum[k] = minutes of episodes [0, k). NumPy array if available, else a list."""
+    if np is not None:
+        d = np.frombuffer(durations, dtype=np.int32).astype(np.int64)
+        d[d <= 0] = default_minutes
+        cum = np.empty(len(d) + 1, dtype=np.int64)
+        cum[0] = 0
+        np.cumsum(d, out=cum[1:])
+        return cum
+    return list(accumulate((m if m > 0 else default_minutes for m in durations), initial=0))
+
+
+def block_ends(cum, ranges: Dict[int, List[Tuple[int, int]]], budgets: Dict[int, int]) -> Optional[List[int]]:
+    """
+    NumPy only: ends[c] = index after the last episode a block starting at
+    episode c airs (>= c + 1, <= end of c's show), for every c in one
+    vectorized searchsorted. None without NumPy (blocks are then cut lazily).
+    """
+    if np is None:
+        return None
+    n = len(cum) - 1
+    budget = np.zeros(n, dtype=np.int64)
+    show_end = np.zeros(n, dtype=np.int64)
+    for slot, shows in ranges.items():
+        for start, end in shows:
+            budget[start:end] = budgets.get(slot, 0)
+            show_end[start:end] = end
+    ends = np.searchsorted(cum, cum[:-1] + budget, side='right') - 1
+    np.maximum(ends, np.arange(1, n + 1), out=ends)
+    np.minimum(ends, show_end, out=ends)
+    return ends.tolist()
+
+
+def plan(store: EpisodeStore, budgets: Dict[int, int], days: int, default_minutes: int = 30) -> Plan:
+    """Pack the store's episodes into `days` days of per-slot budgets. Store must be in ORDER_SQL order."""
+    out = Plan()
+    if not len(store) or not budgets:
+        return out
+    cum = prefix_minutes(store.duration, default_minutes)
+    ranges = show_ranges(store)
+    ends = block_ends(cum, ranges, budgets)
+    # Per slot: show ranges with a moving cursor, and whose turn it is
+    cursors = {s: [list(r) for r in ranges[s]] for s in sorted(budgets) if s in ranges}
+    turn = {s: 0 for s in cursors}
+
+    # One (start, stop, day, slot, start_minute) entry per aired block
+    blocks: List[Tuple[int, int, int, int, int]] = []
+
+    for day in range(days):
+        clock = 0
+        aired = False
+        for slot, rotation in cursors.items():
+            budget = budgets[slot]
+            block_start = clock
+            clock += budget
+            # Next show in this slot that still has episodes
+            for step in range(len(rotation)):
+                show = rotation[(turn[slot] + step) % len(rotation)]
+                if show[0] < show[1]:
+                    turn[slot] = (turn[slot] + step + 1) % len(rotation)
+                    break
+            else:
+                continue
+            c, end = show
+            if ends is not None:
+                take = ends[c]
+            else:
+                take = max(c + 1, bisect_right(cum, cum[c] + budget, c + 1, end + 1) - 1)
+            show[0] = take
+            blocks.append((c, take, day, slot, block_start))
+            aired = True
+        if not aired:
+            break
+
+    if not blocks:
+        return out
+    if np is not None:
+        first, stop, block_day, block_slot, block_minute = np.array(blocks, dtype=np.int64).T
+        lengths = stop - first
+        offsets = np.cumsum(lengths) - lengths
+        idx = np.arange(int(lengths.sum()), dtype=np.int64) + np.repeat(first - offsets, lengths)
+        keys = np.frombuffer(store.rating_key, dtype=np.int64)[idx]
+        minute = cum[idx] - np.repeat(cum[first], lengths) + np.repeat(block_minute, lengths)
+        out.rating_key.frombytes(keys.tobytes())
+        out.day.frombytes(np.repeat(block_day, lengths).astype(np.int32).tobytes())
+        out.slot.frombytes(np.repeat(block_slot, lengths).astype(np.int32).tobytes())
+        out.start_minute.frombytes(minute.astype(np.int32).tobytes())
+        return out
+    rating_key = store.rating_key
+    for c, take, day, slot, minute in blocks:
+        base = cum[c]
+        out.rating_key.extend(rating_key[c:take])
+        out.day.extend([day] * (take - c))
+        out.slot.extend([slot] * (take - c))
+        out.start_minute.extend(minute + cum[k] - base for k in range(c, take))
+    return out
+
+
+def save(conn: sqlite3.Connection, result: Plan) -> None:
+    """Replace the stored plan (plannedOrder, created by db_migrate.migrate()). Caller commits."""
+    conn.execute("DELETE FROM plannedOrder")
+    conn.executemany(
+        "INSERT INTO plannedOrder (position, ratingKey, day, timeSlot, start_minute) VALUES (?, ?, ?, ?, ?)",
+        zip(range(len(result)), result.rating_key, result.day, result.slot, result.start_minute),
+    )
+
+
+def load_planned(conn: sqlite3.Connection, unwatched_only: bool = False,
+                 chunk: int = FETCH_CHUNK) -> Optional[array]:
+    """Planned ratingKeys in order (optionally unwatched ones only), or None if no plan has been saved."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'plannedOrder'").fetchone():
+        return None
+    if not conn.execute("SELECT 1 FROM plannedOrder LIMIT 1").fetchone():
+        return None
+    cur = conn.execute(PLANNED_SQL.format(where="WHERE e.watchedStatus = 0" if unwatched_only else ""))
+    order = array('q')
+    try:
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            order.extend(r[0] for r in rows)
+    finally:
+        cur.close()
+    return order
+
+
+def parse_budgets(values: Sequence[str]) -> Dict[int, int]:
+    budgets = {}
+    for v in values:
+        slot, sep, minutes = v.partition('=')
+        if not sep:
+            raise ValueError(f"budget '{v}' is not SLOT=MINUTES")
+        budgets[int(slot)] = int(minutes)
+    return budgets
+
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def bench(sizes: Sequence[int]) -> None:
+    print(f"[INFO] NumPy: {'yes' if np is not None else 'no (pure Python)'}")
+    print(f"{'episodes':>9} {'load s':>8} {'days':>7} {'plan s':>8} {'planned':>9}")
+    for n in sizes:
+        conn = synthetic_db(n)
+        t0 = time.perf_counter()
+        store = EpisodeStore.load(conn)
+        load = time.perf_counter() - t0
+        budgets = slot_budgets(sorted(set(store.slot)), {}, 24)
+        # A 90-day channel, then a horizon long enough to air every episode
+        for days in (90, n):
+            t1 = time.perf_counter()
+            result = plan(store, budgets, days)
+            elapsed = time.perf_counter() - t1
+            days_used = (result.day[-1] + 1) if len(result) else 0
+            print(f"{n:>9} {load:>8.3f} {days_used:>7} {elapsed:>8.3f} {len(result):>9}")
+        conn.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pack episodes into per-timeslot daily airtime budgets.")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--hours-per-day", type=float, default=24.0)
+    parser.add_argument("--budget", action="append", default=[], metavar="SLOT=MINUTES")
+    parser.add_argument("--default-minutes", type=int, default=30, help="Length assumed for episodes without a duration")
+    parser.add_argument("--dry-run", action="store_true", help="Plan and report without saving")
+    parser.add_argument("--bench", type=int, nargs='+', metavar="EPISODES")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench)
+        return 0
+
+    try:
+        explicit = parse_budgets(args.budget)
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 2
+    if args.days < 1 or args.hours_per_day <= 0 or args.default_minutes < 1:
+        print("[ERROR] --days, --hours-per-day and --default-minutes must be positive", file=sys.stderr)
+        return 2
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        migrate(conn)  # once per run; save() holds no DDL
+    except sqlite3.Error as e:
+        print(f"[ERROR] Could not open SQLite DB at {DB_PATH}: {e}", file=sys.stderr)
+        return 1
+    try:
+        t0 = time.perf_counter()
+        store = EpisodeStore.load(conn)
+        if not len(store):
+            print("[ERROR] No episodes in playlistEpisodes; run getEpisodes.py first.", file=sys.stderr)
+            return 3
+        slots = sorted(set(store.slot))
+        budgets = slot_budgets(slots, explicit, args.hours_per_day)
+        for s, minutes in sorted(budgets.items()):
+            print(f"[INFO] Slot {s}: {minutes} min/day")
+        result = plan(store, budgets, args.days, args.default_minutes)
+        elapsed = time.perf_counter() - t0
+        days_used = (result.day[-1] + 1) if len(result) else 0
+        print(f"[INFO] Planned {len(result)} of {len(store)} episodes over {days_used} days "
+              f"in {elapsed:.3f}s ({'NumPy' if np is not None else 'pure Python'}).")
+        if args.dry_run:
+            return 0
+        with conn:
+            save(conn, result)
+        print("[SUCCESS] Plan saved to plannedOrder.")
+        return 0
+    except sqlite3.Error as e:
+        print(f"[ERROR] SQLite error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
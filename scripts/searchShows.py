@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+searchShows.py
+
+Usage:
+  python searchShows.py [--q "star tr"] [--limit 50] [--after <cursor>]
+
+Purpose:
+  Paged, prefix-searchable listing of the show catalog (allShows) so the UI
+  only fetches the rows it displays. Prints JSON:
+    {"ok": true,
+     "shows": [{"id": 1, "title": "...", "total_episodes": 10, "selected": false}, ...],
+     "next": "<cursor or null>"}
+
+  - --q matches every word as a title prefix ("star tr" finds "Star Trek")
+    through the allShows_fts FTS5 index; falls back to LIKE (word prefixes
+    after the start of the title or a space) if FTS5 is missing.
+  - Paging is keyset-based on (title COLLATE NOCASE, id): pass the returned
+    "next" cursor as --after to get the following page.
+
+Exit codes:
+  1 -> SQLite error
+  2 -> Bad arguments / cursor
+  0 -> Success
+"""
+
+import os
+import re
+import sys
+import json
+import base64
+import sqlite3
+import argparse
+from typing import List, Optional, Tuple
+
+from db_migrate import has_fts
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DB_PATH = os.path.join(ROOT, 'database', 'plex_playlist.db')
+
+MAX_LIMIT = 500
+
+
+def jout(payload, code: int) -> None:
+    print(json.dumps(payload))
+    sys.exit(code)
+
+
+def encode_cursor(title: str, show_id: int) -> str:
+    raw = json.dumps([title, show_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    raw = base64.urlsafe_b64decode(cursor.encode('ascii') + b'=' * (-len(cursor) % 4))
+    title, show_id = json.loads(raw)
+    return str(title), int(show_id)
+
+
+def words(q: str) -> List[str]:
+    return [w for w in re.split(r'\W+', q or '') if w]
+
+
+def fts_query(q: str) -> str:
+    """Each word becomes a quoted prefix term; terms are ANDed."""
+    return ' '.join('"' + w.replace('"', '""') + '"*' for w in words(q))
+
+
+def search(conn: sqlite3.Connection, q: str = '', limit: int = 50,
+           after: Optional[Tuple[str, int]] = None) -> dict:
+    where, params = [], []
+    terms = words(q)
+    if terms:
+        if has_fts(conn):
+            where.append("a.id IN (SELECT rowid FROM allShows_fts WHERE allShows_fts MATCH ?)")
+            params.append(fts_query(q))
+        else:
+            # Word prefix: at the start of the title or after a space
+            for w in terms:
+                w = re.sub(r'([%_\\])', r'\\\1', w)
+                where.append("(a.title LIKE ? ESCAPE '\\' OR a.title LIKE ? ESCAPE '\\')")
+                params.extend([w + '%', '% ' + w + '%'])
+    if after is not None:
+        where.append("(a.title > ? COLLATE NOCASE OR (a.title = ? COLLATE NOCASE AND a.id > ?))")
+        params.extend([after[0], after[0], after[1]])
+
+    sql = f"""
+        SELECT a.id, a.title, a.total_episodes, p.id IS NOT NULL AS selected
+        FROM allShows a
+        LEFT JOIN playlistShows p ON p.id = a.id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY a.title COLLATE NOCASE, a.id
+        LIMIT ?
+    """
+    rows = conn.execute(sql, (*params, limit + 1)).fetchall()
+    page = rows[:limit]
+    shows = [
+        {"id": int(r[0]), "title": r[1], "total_episodes": int(r[2] or 0), "selected": bool(r[3])}
+        for r in page
+    ]
+    nxt = encode_cursor(page[-1][1], int(page[-1][0])) if len(rows) > limit else None
+    return {"ok": True, "shows": shows, "next": nxt}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Paged prefix search over allShows (JSON output).")
+    parser.add_argument("--q", default="", help="Search words (prefix match on title)")
+    parser.add_argument("--limit", type=int, default=50, help=f"Page size (1..{MAX_LIMIT})")
+    parser.add_argument("--after", default="", help="Cursor returned as 'next' by the previous page")
+    args = parser.parse_args()
+
+    limit = max(1, min(MAX_LIMIT, args.limit))
+    try:
+        after = decode_cursor(args.after) if args.after else None
+    except Exception:
+        jout({"ok": False, "error": "Invalid cursor"}, 2)
+
+    try:
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        try:
+            result = search(conn, args.q, limit, after)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        jout({"ok": False, "error": f"SQLite error: {e}"}, 1)
+    jout(result, 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+webhookListener.py
+
+Usage:
+  python webhookListener.py [--host 127.0.0.1] [--port 8765] [--debounce 10]
+                            [--max-delay 120] [--update-playlist]
+
+Purpose:
+  Small HTTP listener for Plex webhooks that keeps playlistEpisodes current
+  without full getEpisodes.py rescans. Point Plex (Settings -> Webhooks) at
+  http://<host>:<port>/ (append ?secret=... if PLEX_WEBHOOK_SECRET is set).
+
+    library.new      new episode/season/show -> episodes of selected shows are
+                     fetched in one bulk request and upserted
+    media.scrobble   episode watched -> watchedStatus = 1
+    library.delete   episode removed -> its rows are deleted. Plex itself does not
+                     send deletion webhooks; this is for external tools and
+                     scripts posting the same payload shape. Show/season deletes
+                     are answered "ignored" (their key matches no episode row);
+                     the next getEpisodes.py run drops those episodes.
+
+  Events are debounced: a batch is applied once no event has arrived for
+  --debounce seconds (or --max-delay after the first one), in one transaction
+  under the pipeline lock, followed by an aggregate refresh of the touched
+  shows. Keys Plex reports as gone while resolving a batch are deleted too.
+  A batch that fails (Plex unreachable, DB busy) is put back and retried with
+  exponential backoff, merged with any events that arrived meanwhile.
+
+  With --update-playlist, newly added episodes are appended (round-robin by
+  timeSlot among themselves) to the playlist of the latest successful
+  pipeline run, and deleted ones are removed from it. A full regeneration
+  restores strict round-robin order.
+
+  Both Plex's multipart/form-data webhooks (JSON in the "payload" field) and
+  plain application/json bodies are accepted, so it can be exercised locally:
+    curl -F 'payload={"event":"media.scrobble","Metadata":{"type":"episode","ratingKey":"123"}}' \\
+         http://127.0.0.1:8765/
+
+Environment:
+  - .env in project root with:
+      PLEX_URL
+      PLEX_TOKEN
+      PLEX_VERIFY_SSL (optional; default "false")
+      PLEX_WEBHOOK_HOST, PLEX_WEBHOOK_PORT, PLEX_WEBHOOK_DEBOUNCE,
+      PLEX_WEBHOOK_MAX_DELAY, PLEX_WEBHOOK_UPDATE_PLAYLIST, PLEX_WEBHOOK_SECRET (optional)
+
+Exit codes:
+  2 -> .env missing or PLEX_* missing
+  3 -> Plex connection failed
+  5 -> SQLite DB missing or cannot be migrated
+  0 -> Stopped
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse, urlunparse, parse_qs
+
+from dotenv import load_dotenv
+from plexapi.server import PlexServer
+
+from plex_session import make_session
+import pipeline_lock
+import missing_keys
+import episode_aggregates
+from db_migrate import migrate
+from episode_ingest import (
+    UPSERT_EPISODE_SQL, UPSERT_DETAILS_SQL, COL_SEASON, COL_EPISODE, COL_SHOW, COL_SLOT, episode_row, episode_details,
+)
+from episode_store import round_robin
+from playlist_fill import chunked, resolve_batch
+
+# ---------------------------
+# Paths & .env loading
+# ---------------------------
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ENV_PATH = os.path.join(ROOT, '.env')
+DB_PATH = os.path.join(ROOT, 'database', 'plex_playlist.db')
+
+NEW_EVENTS = {'library.new'}
+WATCHED_EVENTS = {'media.scrobble'}
+DELETE_EVENTS = {'library.delete'}
+EPISODE_TYPES = {'episode', 'season', 'show'}
+
+# Backoff for batches that fail (e.g. Plex unreachable): 5s, 10s, 20s, ... up to 5 minutes
+RETRY_BASE_SECONDS = 5.0
+RETRY_MAX_SECONDS = 300.0
+
+
+def env_flag(name: str, default: str = 'false') -> bool:
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes')
+
+
+def remap_localhost_for_container(url: str) -> str:
+    """Map localhost/127.0.0.1 to host.docker.internal for container -> host access."""
+    try:
+        u = urlparse(url or '')
+        host = (u.hostname or '').lower()
+        if host in ('localhost', '127.0.0.1'):
+            scheme = (u.scheme or 'http')
+            port = u.port or (443 if scheme == 'https' else 32400)
+            netloc = f"host.docker.internal:{port}"
+            return urlunparse((scheme, netloc, u.path or '', u.params or '', u.query or '', u.fragment or ''))
+    except Exception:
+        pass
+    return url
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+# ---------------------------
+# Payload parsing
+# ---------------------------
+def parse_payload(content_type: str, body: bytes) -> Dict:
+    """Webhook JSON from a multipart 'payload' field or a plain JSON body."""
+    if content_type.lower().startswith('multipart/'):
+        msg = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+        for part in msg.iter_parts():
+            if part.get_param('name', header='content-disposition') == 'payload':
+                return json.loads(part.get_payload(decode=True).decode('utf-8'))
+        raise ValueError("multipart body has no 'payload' field")
+    return json.loads(body.decode('utf-8'))
+
+
+# ---------------------------
+# Debounced event batch
+# ---------------------------
+class PendingEvents:
+    """Thread-safe accumulation of ratingKeys per event kind."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.new: Set[int] = set()
+        self.watched: Set[int] = set()
+        self.deleted: Set[int] = set()
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+        self.not_before = 0.0  # retry backoff after a failed batch
+
+    def add(self, kind: str, rating_key: int) -> None:
+        with self.cond:
+            if kind == 'deleted':
+                self.new.discard(rating_key)
+                self.watched.discard(rating_key)
+                self.deleted.add(rating_key)
+            elif kind == 'new':
+                self.deleted.discard(rating_key)
+                self.new.add(rating_key)
+            else:
+                self.watched.add(rating_key)
+            now = time.monotonic()
+            self.first_at = self.first_at or now
+            self.last_at = now
+            self.cond.notify()
+
+    def requeue(self, new: Set[int], watched: Set[int], deleted: Set[int], delay: float) -> None:
+        """
+        Put a failed batch back, due no earlier than `delay` seconds from now.
+        Events that arrived since the batch was taken are newer and win.
+        """
+        with self.cond:
+            newer = self.new | self.deleted
+            self.deleted |= deleted - newer
+            self.new |= new - newer
+            self.watched |= watched - self.deleted
+            now = time.monotonic()
+            self.first_at = self.first_at or now
+            self.last_at = self.last_at or now
+            self.not_before = now + delay
+            self.cond.notify()
+
+    def take(self, debounce: float, max_delay: float,
+             stop: threading.Event) -> Optional[Tuple[Set[int], Set[int], Set[int]]]:
+        """
+        Block until a batch is due (quiet for `debounce`, or `max_delay` old).
+        On stop, returns whatever is pending, then None.
+        """
+        with self.cond:
+            while True:
+                if self.first_at is None:
+                    if stop.is_set():
+                        return None
+                    self.cond.wait(1.0)
+                    continue
+                now = time.monotonic()
+                due = max(min(self.last_at + debounce, self.first_at + max_delay), self.not_before)
+                if now < due and not stop.is_set():
+                    self.cond.wait(due - now)
+                    continue
+                batch = (self.new, self.watched, self.deleted)
+                self.new, self.watched, self.deleted = set(), set(), set()
+                self.first_at = self.last_at = None
+                return batch
+
+
+# ---------------------------
+# Applying a batch
+# ---------------------------
+def selected_episodes(plex, keys: List[int], selection: Dict[int, int]) -> Tuple[List, List[int]]:
+    """
+    Resolve new-item keys (episodes, seasons or shows) to episodes of selected
+    shows. Returns (episodes, dead_keys).
+    """
+    episodes, dead = [], []
+    for batch in chunked(keys, 500):
+        items, _missing, gone = resolve_batch(plex, batch)
+        dead.extend(gone)
+        for item in items:
+            kind = getattr(item, 'type', '')
+            if kind == 'episode':
+                show = getattr(item, 'grandparentRatingKey', None)
+            elif kind == 'season':
+                show = getattr(item, 'parentRatingKey', None)
+            elif kind == 'show':
+                show = item.ratingKey
+            else:
+                continue
+            if show is None or int(show) not in selection:
+                continue
+            episodes.extend([item] if kind == 'episode' else item.episodes())
+    return episodes, dead
+
+
+def show_ids_for(conn: sqlite3.Connection, keys: Set[int]) -> Set[int]:
+    shows: Set[int] = set()
+    for batch in chunked(sorted(keys), 500):
+        marks = ','.join('?' * len(batch))
+        shows.update(r[0] for r in conn.execute(
+            f"SELECT DISTINCT show_id FROM playlistEpisodes WHERE ratingKey IN ({marks})", batch))
+    return shows
+
+
+def existing_keys(conn: sqlite3.Connection, keys: List[int]) -> Set[int]:
+    found: Set[int] = set()
+    for batch in chunked(keys, 500):
+        marks = ','.join('?' * len(batch))
+        found.update(r[0] for r in conn.execute(
+            f"SELECT ratingKey FROM playlistEpisodes WHERE ratingKey IN ({marks})", batch))
+    return found
+
+
+def latest_playlist_key(conn: sqlite3.Connection) -> Optional[int]:
+    """ratingKey of the playlist built by the most recent successful pipeline run."""
+    try:
+        row = conn.execute(
+            "SELECT result FROM pipelineRuns WHERE status = 'done' ORDER BY finished_at DESC LIMIT 1"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if not row:
+        return None
+    key = json.loads(row[0] or '{}').get('ratingKey')
+    return int(key) if key else None
+
+
+def update_playlist(plex, playlist_key: int, added: List[Tuple[tuple, object]], removed: Set[int]) -> None:
+    """Remove `removed` keys from the playlist and append `added` (row, episode) pairs round-robin by slot."""
+    try:
+        playlist = plex.fetchItem(playlist_key)
+    except Exception as e:
+        log(f"[WARN] Could not fetch playlist {playlist_key}: {e}")
+        return
+    if removed:
+        drop = [i for i in playlist.items() if int(i.ratingKey) in removed]
+        if drop:
+            playlist.removeItems(drop)
+            log(f"[INFO] Removed {len(drop)} items from playlist '{playlist.title}'.")
+    if added:
+        by_key = {row[0]: ep for row, ep in added}
+        grouped: Dict[int, List[int]] = {}
+        ordered = sorted(added, key=lambda a: (a[0][COL_SLOT], a[0][COL_SHOW],
+                                               a[0][COL_SEASON] or 0, a[0][COL_EPISODE] or 0))
+        for row, _ep in ordered:
+            grouped.setdefault(row[COL_SLOT], []).append(row[0])
+        playlist.addItems([by_key[rk] for rk in round_robin(grouped)])
+        log(f"[INFO] Appended {len(added)} episodes to playlist '{playlist.title}'.")
+
+
+def apply_batch(plex, new: Set[int], watched: Set[int], deleted: Set[int], sync_playlist: bool) -> None:
+    log(f"[INFO] Applying batch: {len(new)} new, {len(watched)} watched, {len(deleted)} deleted")
+    pipeline_lock.acquire(blocking=True)
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            selection = {int(k): v for k, v in conn.execute("SELECT id, timeSlot FROM playlistShows")}
+            episodes, dead = selected_episodes(plex, sorted(new), selection) if new else ([], [])
+            gone = deleted | set(dead)
+
+            with conn:
+                touched = show_ids_for(conn, gone | watched)
+                before = existing_keys(conn, [int(ep.ratingKey) for ep in episodes])
+                rows = []
+                for ep in episodes:
+                    show = int(ep.grandparentRatingKey)
+                    rows.append(episode_row(ep, show, selection[show]))
+                    touched.add(show)
+                conn.executemany(UPSERT_EPISODE_SQL, rows)
+                conn.executemany(UPSERT_DETAILS_SQL, [episode_details(ep) for ep in episodes])
+                conn.executemany("DELETE FROM playlistEpisodes WHERE ratingKey = ?", [(k,) for k in gone])
+                conn.executemany("UPDATE playlistEpisodes SET watchedStatus = 1 WHERE ratingKey = ?",
+                                 [(k,) for k in watched])
+                episode_aggregates.refresh_shows(conn, touched)
+            if dead:
+                missing_keys.record_dead(conn, dead)
+            added = [(row, ep) for row, ep in zip(rows, episodes) if row[0] not in before]
+            log(f"[SUCCESS] Upserted {len(rows)} episodes ({len(added)} new), removed {len(gone)}, "
+                f"marked {len(watched)} watched; refreshed {len(touched)} shows.")
+
+            playlist_key = latest_playlist_key(conn) if sync_playlist else None
+        finally:
+            conn.close()
+
+        if playlist_key and (added or gone):
+            # The DB is already committed; retrying the batch would not re-add these
+            try:
+                update_playlist(plex, playlist_key, added, gone)
+            except Exception as e:
+                log(f"[WARN] Playlist {playlist_key} not updated ({e}); the next full generation catches up.")
+    finally:
+        pipeline_lock.release()
+
+
+def worker(plex, pending: PendingEvents, args, stop: threading.Event) -> None:
+    failures = 0
+    while True:
+        batch = pending.take(args.debounce, args.max_delay, stop)
+        if batch is None:
+            return
+        try:
+            apply_batch(plex, *batch, sync_playlist=args.update_playlist)
+            failures = 0
+        except Exception as e:
+            # Typically Plex being briefly unreachable: keep the events and retry with backoff
+            failures += 1
+            if stop.is_set():
+                print(f"[ERROR] Failed to apply webhook batch while stopping; "
+                      f"{sum(len(k) for k in batch)} events dropped: {e}", file=sys.stderr, flush=True)
+                continue
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (failures - 1))
+            print(f"[ERROR] Failed to apply webhook batch ({e}); retrying in {delay:g}s "
+                  f"(attempt {failures + 1}).", file=sys.stderr, flush=True)
+            pending.requeue(*batch, delay=delay)
+
+
+# ---------------------------
+# HTTP handler
+# ---------------------------
+def make_handler(pending: PendingEvents, server_uuid: str, secret: str):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def reply(self, code: int, payload: Dict) -> None:
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if secret and parse_qs(urlparse(self.path).query).get('secret', [''])[0] != secret:
+                self.reply(403, {"ok": False, "error": "bad secret"})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = parse_payload(self.headers.get('Content-Type', ''), self.rfile.read(length))
+            except (ValueError, UnicodeDecodeError) as e:
+                self.reply(400, {"ok": False, "error": f"unreadable payload: {e}"})
+                return
+
+            event = payload.get('event', '')
+            meta = payload.get('Metadata') or {}
+            origin = (payload.get('Server') or {}).get('uuid')
+            if origin and server_uuid and origin != server_uuid:
+                self.reply(200, {"ok": True, "ignored": "other server"})
+                return
+            kind = ('new' if event in NEW_EVENTS else 'watched' if event in WATCHED_EVENTS
+                    else 'deleted' if event in DELETE_EVENTS else None)
+            if kind is None or meta.get('type') not in EPISODE_TYPES or not meta.get('ratingKey'):
+                self.reply(200, {"ok": True, "ignored": event or "no event"})
+                return
+            # Watched/deleted keys are matched against episode rows only
+            if kind in ('watched', 'deleted') and meta.get('type') != 'episode':
+                self.reply(200, {"ok": True, "ignored": f"{event} for a {meta.get('type')}"})
+                return
+            try:
+                rating_key = int(meta['ratingKey'])
+            except (TypeError, ValueError):
+                self.reply(400, {"ok": False, "error": "ratingKey is not an integer"})
+                return
+            pending.add(kind, rating_key)
+            log(f"[INFO] Queued {event} ratingKey={rating_key}")
+            self.reply(202, {"ok": True, "queued": event, "ratingKey": rating_key})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return WebhookHandler
+
+
+def main() -> None:
+    if not os.path.exists(ENV_PATH):
+        print(f"[ERROR] .env not found at {ENV_PATH}", file=sys.stderr)
+        sys.exit(2)
+    load_dotenv(ENV_PATH, override=True)
+
+    parser = argparse.ArgumentParser(description="Apply Plex webhook events to playlistEpisodes incrementally.")
+    parser.add_argument("--host", default=os.getenv('PLEX_WEBHOOK_HOST', '127.0.0.1').strip() or '127.0.0.1')
+    parser.add_argument("--port", type=int, default=int(os.getenv('PLEX_WEBHOOK_PORT', '8765') or 8765))
+    parser.add_argument("--debounce", type=float, default=float(os.getenv('PLEX_WEBHOOK_DEBOUNCE', '10') or 10),
+                        help="Seconds without events before a batch is applied")
+    parser.add_argument("--max-delay", type=float, default=float(os.getenv('PLEX_WEBHOOK_MAX_DELAY', '120') or 120),
+                        help="Upper bound on how long an event waits for its batch")
+    parser.add_argument("--update-playlist", action="store_true", default=env_flag('PLEX_WEBHOOK_UPDATE_PLAYLIST'),
+                        help="Also append/remove items on the latest generated playlist")
+    args = parser.parse_args()
+
+    plex_url = remap_localhost_for_container(os.getenv('PLEX_URL', '').strip())
+    plex_token = os.getenv('PLEX_TOKEN', '').strip()
+    if not plex_url or not plex_token:
+        print("[ERROR] Missing PLEX_URL or PLEX_TOKEN in .env", file=sys.stderr)
+        sys.exit(2)
+    if not os.path.exists(DB_PATH):
+        print(f"[ERROR] Database not found at {DB_PATH}", file=sys.stderr)
+        sys.exit(5)
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            migrate(conn)  # once at startup; batches then only touch rows
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"[ERROR] Could not migrate {DB_PATH}: {e}", file=sys.stderr)
+        sys.exit(5)
+
+    try:
+        plex = PlexServer(plex_url, plex_token, session=make_session(env_flag('PLEX_VERIFY_SSL'), 'webhookListener'))
+    except Exception as e:
+        print(f"[ERROR] Plex connect failed: {e}", file=sys.stderr)
+        sys.exit(3)
+
+    pending = PendingEvents()
+    stop = threading.Event()
+    applier = threading.Thread(target=worker, args=(plex, pending, args, stop), daemon=True)
+    applier.start()
+
+    handler = make_handler(pending, str(getattr(plex, 'machineIdentifier', '') or ''),
+                           os.getenv('PLEX_WEBHOOK_SECRET', '').strip())
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    log(f"[INFO] Listening for Plex webhooks on http://{args.host}:{args.port}/ "
+        f"(debounce {args.debounce:g}s, playlist updates {'on' if args.update_playlist else 'off'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stop.set()
+        with pending.cond:
+            pending.cond.notify_all()
+        applier.join(timeout=60)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
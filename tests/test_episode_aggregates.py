@@ -0,0 +1,40 @@
+import sqlite3
+
+import episode_aggregates
+import missing_keys
+from db_migrate import migrate
+
+
+def _db():
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+    return conn
+
+
+def test_show_without_timeslot_counts_towards_no_slot():
+    conn = _db()
+    unassigned = episode_aggregates.ShowAggregate(1, None)
+    unassigned.add(1, 30, False, '2020-01-01')
+    assigned = episode_aggregates.ShowAggregate(2, 1)
+    assigned.add(1, 20, False, '2020-01-01')
+    episode_aggregates.write_show(conn, unassigned)
+    episode_aggregates.write_show(conn, assigned)
+
+    assert conn.execute("SELECT timeSlot, show_count, total_minutes FROM slotAggregates").fetchall() == [(1, 1, 20)]
+    episode_aggregates.rebuild_slots(conn)
+    assert conn.execute("SELECT timeSlot, show_count, total_minutes FROM slotAggregates").fetchall() == [(1, 1, 20)]
+
+
+def test_record_dead_refreshes_aggregates():
+    conn = _db()
+    conn.executemany(
+        "INSERT INTO playlistEpisodes (ratingKey, season, episode, duration, watchedStatus, show_id, timeSlot) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(10, 1, 1, 20, 0, 2, 1), (11, 1, 2, 25, 0, 2, 1)],
+    )
+    episode_aggregates.refresh_shows(conn, [2])
+
+    missing_keys.record_dead(conn, [11])
+
+    assert conn.execute("SELECT episode_count, total_minutes FROM showAggregates WHERE show_id = 2").fetchone() == (1, 20)
+    assert conn.execute("SELECT episode_count, total_minutes FROM slotAggregates WHERE timeSlot = 1").fetchone() == (1, 20)
@@ -0,0 +1,26 @@
+from episode_store import EpisodeStore
+
+
+def test_null_timeslot_mid_chunk_keeps_columns_aligned():
+    store = EpisodeStore()
+    store.extend_rows([
+        (1, 1, 10, 1, 1, 30),
+        (2, None, 10, 1, 2, 30),
+        (3, 2, 20, 1, 1, 30),
+        (4, 2, 20, 1, 2, 30),
+    ])
+
+    assert list(store.rating_key) == [1, 3, 4]
+    assert list(store.slot) == [1, 2, 2]
+    assert len(store.show) == len(store.duration) == 3
+    assert {k: list(v) for k, v in store.group_by_slot().items()} == {1: [1], 2: [3, 4]}
+
+
+def test_append_overflow_leaves_store_unchanged():
+    store = EpisodeStore()
+    store.append(1, 1, None, None, None, None)
+    try:
+        store.append(2, 1, 10, 1, 1, 2 ** 40)
+    except OverflowError:
+        pass
+    assert [len(c) for c in store._columns()] == [1] * 6